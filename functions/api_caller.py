@@ -2,12 +2,327 @@
 import pandas as pd
 import numpy as np
 
-# api library
-from sodapy import Socrata
+# caching packages
+import gzip
+import hashlib
+import io
+import json
+import os
 
 from functions.data_cleaning import status_update, transform_category
 
 
+# shared API clients (each holds a connection pool), keyed by (base_url, api_token)
+_CLIENTS = {}
+
+# data types of columns when decoding CSV responses (columns that aren't
+# returned are ignored)
+# NOTE: 'category' gives each batch its own categories; use `csv_dtypes` for
+# categories that are the same in every batch
+CSV_DTYPES = {
+    'collection': 'category',
+    'itemtype': 'category',
+    'checkoutyear': 'Int16'
+}
+
+# data dictionary code types of the categorical columns of CSV responses
+CSV_CODE_TYPES = {
+    'collection': 'ItemCollection',
+    'itemtype': 'ItemType'
+}
+
+
+class _TeeReader(io.RawIOBase):
+    '''
+    Read-only stream that copies everything read from a source stream into
+    another file, so a response can be cached while it is being decoded.
+    '''
+
+    def __init__(self, source, copy):
+        self.source = source
+        self.copy = copy
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.source.read(len(buffer))
+        if not data:
+            self.finished = True
+        self.copy.write(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def csv_dtypes(dd_file_path, dtype=CSV_DTYPES, code_types=CSV_CODE_TYPES):
+    '''
+    Function to build data types for decoding CSV responses in which the
+    categorical columns have fixed categories (the codes listed in the data
+    dictionary), so every batch has the same data types and concatenated
+    batches stay categorical.
+
+    Input
+    -----
+    dd_file_path : str
+        File path of the original data dictionary CSV.
+
+    Optional input
+    --------------
+    dtype : dict
+        Data types to start from (default=`CSV_DTYPES`).
+
+    code_types : dict
+        Columns mapped to the data dictionary code type listing their
+        categories (default=`CSV_CODE_TYPES`).
+
+    Output
+    ------
+    dtypes : dict
+        Data types of columns, to pass as `dtype` to `api_date_batches`.
+        NOTE: Codes missing from the data dictionary are decoded as NaN.
+    '''
+
+    # load data dictionary (code and code type are the first and third columns)
+    dd = pd.read_csv(dd_file_path)
+    codes, types = dd.iloc[:, 0], dd.iloc[:, 2]
+
+    # copy so the defaults are unchanged
+    dtypes = dict(dtype)
+
+    # fixed categories for each categorical column
+    for col, code_type in code_types.items():
+        dtypes[col] = pd.CategoricalDtype(sorted(codes[types == code_type].dropna().unique()))
+
+    return dtypes
+
+
+def concat_batches(batches):
+    '''
+    Function to concatenate DataFrame batches (e.g. from `api_date_batches`),
+    keeping categorical columns categorical even when batches have different
+    categories (via `union_categoricals`).
+
+    Input
+    -----
+    batches : iterable (Pandas DataFrame)
+        Batches with the same columns.
+
+    Output
+    ------
+    df : Pandas DataFrame
+        All batches as one DataFrame.
+    '''
+
+    # materialize the batches
+    batches = list(batches)
+
+    if not batches:
+        return pd.DataFrame()
+
+    # categorical columns of the first batch
+    cat_cols = [col for col in batches[0].columns
+                if isinstance(batches[0][col].dtype, pd.CategoricalDtype)]
+
+    # combine categories, then concatenate the other columns
+    combined = {
+        col: pd.api.types.union_categoricals([batch[col] for batch in batches])
+        for col in cat_cols
+    }
+    df = pd.concat([batch.drop(columns=cat_cols) for batch in batches], ignore_index=True)
+
+    # add categorical columns back in their original positions
+    for col in cat_cols:
+        df.insert(batches[0].columns.get_loc(col), col, combined[col])
+
+    return df
+
+
+def get_client(base_url, api_token):
+    '''
+    Function to retrieve a shared API client, so repeated calls reuse one
+    connection pool instead of instantiating a new client each time.
+
+    Input
+    -----
+    base_url : str
+        URL for site containing API (e.g. 'data.seattle.gov').
+
+    api_token : str
+        Unique user token for calling to API.
+
+    Output
+    ------
+    client : sodapy.Socrata
+        Shared API object.
+    '''
+
+    # instantiate API object once per site and token
+    if (base_url, api_token) not in _CLIENTS:
+
+        # api library (imported here so the data transformation functions don't need it)
+        from sodapy import Socrata
+
+        _CLIENTS[(base_url, api_token)] = Socrata(base_url, api_token)
+
+    return _CLIENTS[(base_url, api_token)]
+
+
+def window_is_final(end_date, today=None):
+    '''
+    Function to determine whether a date window ends before the current week
+    (Monday onward), i.e. its data will no longer change.
+
+    Input
+    -----
+    end_date : str
+        Date or timestamp at which the window ends.
+
+    Optional input
+    --------------
+    today : str
+        Date to treat as today (default=None, i.e. the actual current date).
+
+    Output
+    ------
+    final : bool
+        True if the window ends before the current week.
+    '''
+
+    # today's date
+    today = pd.Timestamp(today).normalize() if today else pd.Timestamp.today().normalize()
+
+    # most recent Monday
+    week_start = today - pd.Timedelta(days=today.dayofweek)
+
+    return pd.Timestamp(end_date) < week_start
+
+
+def cache_path(cache_dir, url_addon_code, ext='json.gz', base_url='data.seattle.gov', **params):
+    '''
+    Function to build the cache file path for an API request, keyed by a hash
+    of the site, dataset code and query parameters (where, select, order, limit,
+    offset, etc.).
+
+    Input
+    -----
+    cache_dir : str
+        Folder containing cached responses.
+
+    url_addon_code : str
+        Code for particular dataset.
+
+    Optional input
+    --------------
+    ext : str
+        Extension of the cache file (default='json.gz').
+
+    base_url : str
+        URL for site containing API (default='data.seattle.gov')
+
+    **params
+        Query parameters of the request.
+
+    Output
+    ------
+    file_path : str
+        Path of the cache file.
+    '''
+
+    # stable representation of the request
+    request = json.dumps(
+        {'base_url': base_url, 'dataset': url_addon_code, **params},
+        sort_keys=True,
+        default=str
+    )
+
+    # hash as file name
+    key = hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    return os.path.join(cache_dir, f'{key}.{ext}')
+
+
+def cached_api_get(
+    url_addon_code,
+    api_token,
+    cache_dir=None,
+    final=False,
+    offline=False,
+    base_url='data.seattle.gov',
+    **params
+):
+
+    '''
+    Function to call the API, storing each response compressed on disk and
+    reusing it for identical requests.
+
+    Cached responses are reused only if the requested window is final (see
+    `window_is_final`); otherwise the API is always called and the cache
+    refreshed.
+
+    Input
+    -----
+    url_addon_code : str
+        Code for particular dataset.
+
+    api_token : str
+        Unique user token for calling to API.
+
+    Optional input
+    --------------
+    cache_dir : str
+        Folder in which to cache responses (default=None, i.e. no caching).
+
+    final : bool
+        Whether the requested data can no longer change, so a cached response
+        never expires (default=False).
+
+    offline : bool
+        Whether to only read from the cache, raising an error if the response
+        isn't cached (default=False).
+
+    base_url : str
+        URL for site containing API (default='data.seattle.gov')
+
+    **params
+        Query parameters passed to `sodapy.Socrata.get` (where, select, order,
+        limit, offset, etc.).
+
+    Output
+    ------
+    results : list (dict)
+        Returned items, as converted from JSON by sodapy.
+    '''
+
+    # path of cached response
+    file_path = None
+    if cache_dir:
+        file_path = cache_path(cache_dir, url_addon_code, base_url=base_url, **params)
+
+    # use cached response
+    if file_path and os.path.exists(file_path) and (final or offline):
+        with gzip.open(file_path, 'rt', encoding='utf-8') as cached:
+            return json.load(cached)
+
+    # nothing to fall back on
+    if offline:
+        raise FileNotFoundError(
+            f'Response not cached for {url_addon_code} with {params}.'
+        )
+
+    # results returned as JSON from API / converted to Python list of
+    # dictionaries by sodapy
+    results = get_client(base_url, api_token).get(url_addon_code, **params)
+
+    # save to cache, via a temporary file so partial writes are never read
+    if file_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        with gzip.open(file_path + '.tmp', 'wt', encoding='utf-8') as cached:
+            json.dump(results, cached)
+        os.replace(file_path + '.tmp', file_path)
+
+    return results
+
 
 def api_date_caller(
     url_addon_code,
@@ -17,6 +332,8 @@ def api_date_caller(
     end_date,
     limit=1000000,
     base_url='data.seattle.gov',
+    cache_dir=None,
+    offline=False,
     **kwargs
 ):
 
@@ -54,6 +371,16 @@ def api_date_caller(
     base_url : str
         URL for site containing API (default='data.seattle.gov')
 
+    cache_dir : str
+        Folder in which to cache responses (default=None, i.e. no caching).
+            Windows ending before the current week are read from the cache if
+            available; windows reaching into the current week are always
+            refetched.
+
+    offline : bool
+        Whether to only read from the cache, raising an error if the response
+        isn't cached (default=False).
+
     **kwargs
         Possible arguments include:
             select : the set of columns to be returned, defaults to *
@@ -78,13 +405,15 @@ def api_date_caller(
     Code heavily borrowed from `https://dev.socrata.com/foundry/data.seattle.gov/5src-czff` 
     '''
     
-    # instantiate API object, including user's unique token
-    client = Socrata(base_url, api_token)
-    
-    # results returned as JSON from API / converted to Python list of
+    # results returned as JSON from API (or cache) / converted to Python list of
     # dictionaries by sodapy
-    results = client.get(
+    results = cached_api_get(
         url_addon_code,
+        api_token,
+        cache_dir=cache_dir,
+        final=window_is_final(end_date),
+        offline=offline,
+        base_url=base_url,
         where=f"{date_column} between '{begin_date}' and '{end_date}'",
         limit=limit,
         **kwargs
@@ -96,6 +425,182 @@ def api_date_caller(
     return results_df
 
 
+def api_date_batches(
+    url_addon_code,
+    api_token,
+    date_column,
+    begin_date,
+    end_date,
+    limit=1000000,
+    batch_size=100000,
+    base_url='data.seattle.gov',
+    cache_dir=None,
+    offline=False,
+    dtype=CSV_DTYPES,
+    **kwargs
+):
+
+    '''
+    Function to call the API for Seattle Open Data based on a range of dates,
+    requesting the CSV representation and decoding it incrementally into typed
+    DataFrame batches. This avoids building a Python list of dictionaries for
+    every row (see `api_date_caller`).
+
+    When caching, the response is written to the cache as it is decoded, so the
+    first batch doesn't wait for the whole download; the cache file is only kept
+    if every batch is read.
+
+    Input
+    -----
+    url_addon_code : str
+        Code for particular dataset.
+
+    api_token : str
+        Unique user token for calling to API.
+
+    date_column : str
+        Name of the column containing date information (parsed as datetime).
+
+    begin_date : str
+        Date or timestamp at which to begin collecting data.
+
+    end_date : str
+        Date or timestamp at which to stop collecting data.
+
+    Optional input
+    --------------
+    limit : int
+        Maximum number of items (rows) to return (default=1000000, i.e. 1 million).
+
+    batch_size : int
+        Number of rows in each returned DataFrame (default=100000).
+
+    base_url : str
+        URL for site containing API (default='data.seattle.gov')
+
+    cache_dir : str
+        Folder in which to cache responses as compressed CSV (default=None, i.e.
+        no caching). Same expiration rules as `api_date_caller`.
+
+    offline : bool
+        Whether to only read from the cache, raising an error if the response
+        isn't cached (default=False).
+
+    dtype : dict
+        Data types of columns (default=`CSV_DTYPES`, i.e. categorical collection
+        and item type, with categories found in each batch). Pass the output of
+        `csv_dtypes` for the same categories in every batch, or combine batches
+        with `concat_batches`.
+
+    **kwargs
+        Other SoQL parameters without the leading '$' (select, order, offset,
+        etc.).
+
+    Output
+    ------
+    batches : generator (Pandas DataFrame)
+        Returned items as rows in Pandas DataFrames of up to `batch_size` rows.
+    '''
+
+    # SoQL parameters
+    params = {
+        '$where': f"{date_column} between '{begin_date}' and '{end_date}'",
+        '$limit': limit,
+        **{f'${key}': value for key, value in kwargs.items()}
+    }
+
+    # path of cached response
+    file_path = None
+    if cache_dir:
+        file_path = cache_path(
+            cache_dir, url_addon_code, ext='csv.gz', base_url=base_url, **params
+        )
+
+    # whether to read a cached response
+    use_cache = file_path and os.path.exists(file_path) and (
+        window_is_final(end_date) or offline
+    )
+
+    # nothing to fall back on
+    if offline and not use_cache:
+        raise FileNotFoundError(
+            f'Response not cached for {url_addon_code} with {params}.'
+        )
+
+    # parse the date column only if it is returned
+    select = kwargs.get('select')
+    parse_dates = [date_column] if not select or date_column in select else None
+
+    # call API unless the cache is used
+    response = None
+    if not use_cache:
+
+        # shared API object (its session holds the user's token)
+        client = get_client(base_url, api_token)
+
+        # stream the CSV representation of the results
+        response = client.session.get(
+            f'{client.uri_prefix}{client.domain}/resource/{url_addon_code}.csv',
+            params=params,
+            stream=True,
+            timeout=client.timeout
+        )
+        response.raise_for_status()
+
+        # let urllib3 undo any transfer compression
+        response.raw.decode_content = True
+
+    # cache file being written while decoding
+    cached = None
+
+    try:
+
+        # source of the CSV
+        if use_cache:
+            source = gzip.open(file_path, 'rb')
+
+        # copy to the cache while decoding, via a temporary file so partial
+        # writes are never read
+        elif file_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            cached = gzip.open(file_path + '.tmp', 'wb')
+            tee = _TeeReader(response.raw, cached)
+            source = io.BufferedReader(tee)
+
+        else:
+            source = response.raw
+
+        # decode in batches with the C parser
+        with source:
+            reader = pd.read_csv(
+                source,
+                dtype=dtype,
+                parse_dates=parse_dates,
+                chunksize=batch_size,
+                engine='c'
+            )
+
+            for batch in reader:
+                yield batch
+
+        # keep the cache only if the whole response was read
+        if cached is not None:
+            cached.close()
+            if tee.finished:
+                os.replace(file_path + '.tmp', file_path)
+
+    finally:
+        # discard an incomplete cache file
+        if cached is not None:
+            cached.close()
+            if os.path.exists(file_path + '.tmp'):
+                os.remove(file_path + '.tmp')
+
+        # return the connection to the pool
+        if response is not None:
+            response.close()
+
+
 def data_dict_prepper(file_path):
 
     # load data
@@ -142,8 +647,11 @@ def data_transformer(
     # convert to datetime, dropping the hour-minute-second stamp using the `dt.date` attribute
     df[date_col] = pd.to_datetime(df[date_col], format=dt_format).dt.date
 
-    # prep data dictionary for merge
-    dd = data_dict_prepper(dd_file_path)
+    # prep data dictionary for merge (unless already prepped)
+    if isinstance(dd_file_path, pd.DataFrame):
+        dd = dd_file_path
+    else:
+        dd = data_dict_prepper(dd_file_path)
 
     # merge checkouts dataframe with info from data dictionary
     df_merged = df.merge(dd, left_on=code_col, right_on='code')
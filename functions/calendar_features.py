@@ -0,0 +1,386 @@
+# standard dataframe packages
+import pandas as pd
+import numpy as np
+
+# os packages
+import os
+
+
+# periods when the library system was closed to the public, as (start, end)
+# pairs of '%Y-%m-%d' strings (end is inclusive; `None` means still closed as of
+# the last date of the data, and is never extended past it)
+CLOSURE_PERIODS = [
+    # pandemic closure (all branches closed to the public on March 13, 2020)
+    ('2020-03-13', None),
+]
+
+# column names of the calendar feature table, in order
+CALENDAR_COLUMNS = [
+    'day_of_week',
+    'weekend',
+    'us_holiday',
+    'wa_holiday',
+    'days_to_holiday',
+    'days_from_holiday',
+    'closed'
+]
+
+
+def _holiday_days(years, subdiv=None):
+    '''
+
+    Function to retrieve holidays as a sorted array of day numbers
+    (days since 1970-01-01).
+
+
+    Input
+    -----
+    years : list (int)
+            Years for which to collect holidays.
+
+
+    Optional input
+    --------------
+    subdiv : str
+            State code for state-specific holidays (default=None, i.e. federal only).
+
+
+    Output
+    ------
+    days : NumPy array (int64)
+            Sorted, unique day numbers of each holiday (including observed dates).
+
+    '''
+
+    # time-related packages
+    import holidays
+
+    # holiday calendar for the given years
+    calendar = holidays.US(subdiv=subdiv, years=years)
+
+    # convert dates to day numbers
+    days = np.array(
+        sorted(calendar.keys()),
+        dtype='datetime64[D]'
+    ).astype(np.int64)
+
+    return np.unique(days)
+
+
+def _distance_to_nearest(days, targets):
+    '''
+
+    Function to calculate the number of days to the next target and from the
+    previous target for each day, via binary search over the sorted targets.
+
+
+    Input
+    -----
+    days : NumPy array (int64)
+            Day numbers to measure from.
+
+    targets : NumPy array (int64)
+            Sorted day numbers to measure to.
+
+
+    Output
+    ------
+    days_to : NumPy array (int16)
+            Days until the next target (0 on a target day).
+
+    days_from : NumPy array (int16)
+            Days since the previous target (0 on a target day).
+
+    '''
+
+    # position of the first target on or after each day
+    right = np.searchsorted(targets, days, side='left')
+
+    # position of the last target on or before each day
+    left = np.searchsorted(targets, days, side='right') - 1
+
+    # targets always extend a year past each end of `days`, so clip is a safeguard
+    right = np.clip(right, 0, len(targets) - 1)
+    left = np.clip(left, 0, len(targets) - 1)
+
+    # distances in days
+    days_to = (targets[right] - days).astype(np.int16)
+    days_from = (days - targets[left]).astype(np.int16)
+
+    return days_to, days_from
+
+
+def build_calendar_features(
+        start='2005-01-01',
+        end=None,
+        closure_periods=CLOSURE_PERIODS,
+        data_end=None):
+    '''
+
+    Function to build a daily table of calendar features for use as exogenous
+    regressors (e.g. `exog` for SARIMAX) or for grouping checkout counts.
+
+    All columns are stored as small integer NumPy arrays:
+        day_of_week       : 0 = Monday, ..., 6 = Sunday
+        weekend           : 1 if Saturday or Sunday, 0 if not
+        us_holiday        : 1 if a federal holiday (or observed date), 0 if not
+        wa_holiday        : 1 if a Washington state holiday (or observed date), 0 if not
+        days_to_holiday   : days until the next Washington holiday
+        days_from_holiday : days since the previous Washington holiday
+        closed            : 1 if the library was closed (holiday or closure period), 0 if not
+
+
+    Optional input
+    --------------
+    start : str
+            First date of the table (default='2005-01-01').
+
+    end : str
+            Last date of the table, inclusive (default=None, i.e. December 31 of
+            the current year).
+
+    closure_periods : list (tuple)
+            List of (start, end) '%Y-%m-%d' string pairs when the library was closed,
+            with `None` as the end of an ongoing closure (default=`CLOSURE_PERIODS`).
+
+    data_end : str
+            Last date of the data; ongoing closures end here rather than at the end
+            of the table, since later dates are unknown (default=None, i.e. today).
+
+
+    Output
+    ------
+    features : Pandas DataFrame
+            Calendar features with a daily DatetimeIndex named 'date'.
+
+    '''
+
+    # default to the end of the current year
+    if end is None:
+        end = f'{pd.Timestamp.today().year}-12-31'
+
+    # full daily calendar
+    index = pd.date_range(start, end, freq='D', name='date')
+
+    # day numbers for vectorized comparisons
+    days = index.values.astype('datetime64[D]').astype(np.int64)
+
+    # include a year on each side so distances near the edges are correct
+    years = list(range(index[0].year - 1, index[-1].year + 2))
+
+    # federal and state holidays
+    us_days = _holiday_days(years)
+    wa_days = _holiday_days(years, subdiv='WA')
+
+    # day of week
+    day_of_week = index.dayofweek.values.astype(np.int8)
+
+    # holiday flags
+    us_holiday = np.isin(days, us_days).astype(np.int8)
+    wa_holiday = np.isin(days, wa_days).astype(np.int8)
+
+    # distances to and from the nearest state holiday
+    days_to, days_from = _distance_to_nearest(days, wa_days)
+
+    # library closed on holidays
+    closed = wa_holiday.copy()
+
+    # loop through closure periods
+    for period_start, period_end in closure_periods:
+
+        # ongoing closure extends through the last date of the data only
+        period_end = period_end or (data_end or pd.Timestamp.today().normalize())
+
+        # flag closure days
+        closed[(index >= period_start) & (index <= period_end)] = 1
+
+    # combine into a DataFrame
+    features = pd.DataFrame(
+        {
+            'day_of_week': day_of_week,
+            'weekend': (day_of_week >= 5).astype(np.int8),
+            'us_holiday': us_holiday,
+            'wa_holiday': wa_holiday,
+            'days_to_holiday': days_to,
+            'days_from_holiday': days_from,
+            'closed': closed
+        },
+        index=index
+    )
+
+    return features
+
+
+def _feature_params(start, closure_periods, data_end):
+    '''
+
+    Function to describe the parameters a calendar feature table was built with,
+    so a cached table can be checked against the parameters of a new request.
+
+    '''
+
+    # normalize dates to '%Y-%m-%d' strings (ongoing closures keep `None`)
+    def as_date(value):
+        return None if value is None else str(pd.Timestamp(value).date())
+
+    return {
+        'start': as_date(start),
+        'closure_periods': [(as_date(s), as_date(e)) for s, e in closure_periods],
+        'data_end': as_date(data_end)
+    }
+
+
+def calendar_features(
+        index=None,
+        cache_path='data/calendar_features.pkl',
+        start='2005-01-01',
+        end=None,
+        closure_periods=CLOSURE_PERIODS,
+        data_end=None,
+        refresh=False):
+    '''
+
+    Function to load (or build and cache) the calendar feature table, optionally
+    aligned to the index of a daily counts table.
+
+    The table is built once from `start` and saved as a compressed pickle, along
+    with the parameters it was built with; it is only rebuilt when it does not
+    cover the requested dates (or `end`), `start`, `closure_periods` or `data_end`
+    differ from the cached ones, or `refresh` is set.
+
+
+    Optional input
+    --------------
+    index : Pandas DatetimeIndex
+            Daily index to align to, e.g. `df_counts.index` (default=None, i.e.
+            return the full cached table).
+
+    cache_path : str
+            File path of the cached table (default='data/calendar_features.pkl').
+            Set to None to skip caching.
+
+    start : str
+            First date of the table when building (default='2005-01-01').
+
+    end : str
+            Last date of the table when building, inclusive (default=None, i.e.
+            December 31 of the current year).
+
+    closure_periods : list (tuple)
+            List of (start, end) closure periods when building
+            (default=`CLOSURE_PERIODS`).
+
+    data_end : str
+            Last date of the data, through which ongoing closures are flagged
+            (default=None, i.e. the last date of `index`, or today without one).
+            Pass the last observed date when `index` includes forecast dates.
+
+    refresh : bool
+            Whether or not to rebuild the table even if it is cached (default=False).
+
+
+    Output
+    ------
+    features : Pandas DataFrame
+            Calendar features, aligned to `index` if provided.
+
+    '''
+
+    # requested dates
+    if index is not None:
+        index = pd.DatetimeIndex(index)
+
+    # last date of the data, for ongoing closures
+    if data_end is None:
+        if index is not None and len(index):
+            data_end = index.max().normalize()
+        else:
+            data_end = pd.Timestamp.today().normalize()
+
+    # parameters of the requested table
+    params = _feature_params(start, closure_periods, data_end)
+
+    # instantiate as empty
+    features = None
+
+    # load from cache, unless it was built with different parameters
+    if cache_path and not refresh and os.path.exists(cache_path):
+        features = pd.read_pickle(cache_path, compression='gzip')
+        if features.attrs.get('params') != params:
+            features = None
+
+    # rebuild if missing or if the cached table doesn't cover the requested dates
+    if features is None or (
+            end is not None and pd.Timestamp(end) > features.index[-1]) or (
+            index is not None and len(index)
+            and (index.min() < features.index[0] or index.max() > features.index[-1])):
+
+        # extend range to cover the requested dates
+        if index is not None and len(index):
+            start = min(pd.Timestamp(start), index.min().normalize())
+            end = max(
+                pd.Timestamp(end or f'{pd.Timestamp.today().year}-12-31'),
+                index.max().normalize()
+            )
+
+        # build table
+        features = build_calendar_features(
+            start=start, end=end, closure_periods=closure_periods, data_end=data_end
+        )
+
+        # remember the requested parameters
+        features.attrs['params'] = params
+
+        # save
+        if cache_path:
+            if os.path.dirname(cache_path):
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            features.to_pickle(cache_path, compression='gzip')
+
+    # align to requested dates
+    if index is not None:
+        features = features.reindex(index.normalize())
+        features.index = index
+
+    return features
+
+
+def split_by_feature(target, features, column, value=1):
+    '''
+
+    Function to split a daily series into two groups based on a calendar feature,
+    e.g. weekend vs. weekday or holiday vs. non-holiday, for plots and t-tests.
+
+
+    Input
+    -----
+    target : Pandas Series
+            Daily series with a DatetimeIndex.
+
+    features : Pandas DataFrame
+            Calendar feature table (see `calendar_features`).
+
+    column : str
+            Name of the feature to split on.
+
+
+    Optional input
+    --------------
+    value : int
+            Value of the feature that defines the first group (default=1).
+
+
+    Output
+    ------
+    in_group : Pandas Series
+            Values of `target` on days where the feature equals `value`.
+
+    out_group : Pandas Series
+            Values of `target` on all other days.
+
+    '''
+
+    # feature values aligned to the target
+    mask = features[column].reindex(target.index).values == value
+
+    return target[mask], target[~mask]
@@ -389,3 +389,171 @@ def imputer(df, ind, col, window, unit='W'):
     # if list is empty, return NaN
     else:
         return np.nan
+
+
+def find_date_gaps(df, start=None, end=None, freq='D'):
+    '''
+
+    Function to find all dates missing from a time-indexed DataFrame (e.g. the daily
+    counts table), along with contiguous runs of missing dates and yearly totals.
+
+
+    Input
+    -----
+    df : Pandas DataFrame or Series
+            Data indexed by date.
+
+
+    Optional input
+    --------------
+    start : str or timestamp
+            First date of the full calendar (default=None, i.e. first date in `df`).
+
+    end : str or timestamp
+            Last date of the full calendar, inclusive (default=None, i.e. last date
+            in `df`).
+
+    freq : str
+            Frequency of the full calendar (default='D').
+
+
+    Output
+    ------
+    missing : Pandas DatetimeIndex
+            Dates in the full calendar that are absent from `df`.
+
+    runs : Pandas DataFrame
+            One row per contiguous run of missing dates, with columns 'start',
+            'end' and 'length'.
+
+    yearly : Pandas Series
+            Number of missing dates per year (including years with none missing).
+
+    '''
+
+    # sorted, unique dates
+    index = pd.DatetimeIndex(pd.to_datetime(df.index)).sort_values().unique()
+
+    # full calendar
+    full = pd.date_range(
+        start if start is not None else index[0],
+        end if end is not None else index[-1],
+        freq=freq
+    )
+
+    # dates in calendar but not in data
+    missing = full[~full.isin(index)]
+
+    # missing dates per year
+    yearly = pd.Series(1, index=missing).groupby(missing.year).sum().reindex(
+        range(full[0].year, full[-1].year + 1), fill_value=0
+    )
+    yearly.index.name = 'year'
+
+    # no gaps: no runs to find
+    if len(missing) == 0:
+        runs = pd.DataFrame({
+            'start': pd.DatetimeIndex([]),
+            'end': pd.DatetimeIndex([]),
+            'length': np.array([], dtype=np.int64)
+        })
+        return missing, runs, yearly
+
+    # position of each missing date within the full calendar
+    positions = full.get_indexer(missing)
+
+    # a new run begins wherever positions are not consecutive
+    run_starts = np.flatnonzero(np.diff(positions, prepend=-2) != 1)
+
+    # run boundaries (as positions within `missing`)
+    run_ends = np.append(run_starts[1:], len(missing)) - 1
+
+    # contiguous runs
+    runs = pd.DataFrame({
+        'start': missing[run_starts],
+        'end': missing[run_ends],
+        'length': run_ends - run_starts + 1
+    })
+
+    return missing, runs, yearly
+
+
+def impute_date_gaps(df, cols=None, window=2, unit='W', missing=None):
+    '''
+
+    Function to add rows for dates missing from a time-indexed DataFrame and fill
+    them with the average of values in previous and future units. This is a
+    vectorized equivalent of calling `imputer` for each missing date and column.
+
+
+    Input
+    -----
+    df : Pandas DataFrame
+            Data indexed by date (e.g. the daily counts table).
+
+
+    Optional input
+    --------------
+    cols : list (str)
+            Columns to impute (default=None, i.e. all columns).
+
+    window : int
+            Number of previous and future units to consider in tallying the
+            average (default=2).
+
+    unit : str
+            The unit of time to consider in tallying the average (default='W').
+            For possible values, refer to:
+                    `https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.to_timedelta.html`
+
+    missing : Pandas DatetimeIndex
+            Dates to impute (default=None, i.e. found via `find_date_gaps`).
+
+
+    Output
+    ------
+    df_imputed : Pandas DataFrame
+            Data with a complete daily DatetimeIndex and missing dates imputed.
+
+    '''
+
+    # make sure the index is datetime
+    df = df.copy()
+    df.index = pd.DatetimeIndex(pd.to_datetime(df.index))
+
+    # find missing dates
+    if missing is None:
+        missing, _, _ = find_date_gaps(df)
+
+    # nothing to impute
+    if len(missing) == 0:
+        return df
+
+    # columns to impute
+    if cols is None:
+        cols = list(df.columns)
+
+    # previous and future offsets within the window
+    offsets = [
+        sign * pd.to_timedelta(i, unit=unit)
+        for i in range(1, window + 1)
+        for sign in (-1, 1)
+    ]
+
+    # neighboring values for every missing date at once (dates outside the data are NaN)
+    neighbors = np.stack(
+        [df[cols].reindex(missing + offset).to_numpy(dtype=float) for offset in offsets]
+    )
+
+    # average of non-NaN neighbors, rounded (NaN if there are none)
+    with np.errstate(invalid='ignore'):
+        counts = (~np.isnan(neighbors)).sum(axis=0)
+        avg = np.round(np.nansum(neighbors, axis=0) / counts)
+
+    # add missing dates to the index (keeping its name, e.g. `date`)
+    df_imputed = df.reindex(df.index.union(missing).rename(df.index.name))
+
+    # fill in imputed values
+    df_imputed.loc[missing, cols] = avg
+
+    return df_imputed
@@ -2,176 +2,580 @@
 import pandas as pd
 import numpy as np
 
-# saving packages
-import pickle
-import gzip
+# command line and os packages
+import argparse
+import os
 
-from data_cleaning import status_update
+from functions.data_cleaning import (
+    status_update, load_multi_df, transform_category, find_date_gaps, impute_date_gaps
+)
+from functions.api_caller import data_transformer, data_dict_prepper
+from functions.shard_writer import save_shards, load_manifest
+from functions.pipeline_cache import cached_stage
 
 
-# path to data folder
-data_path = '/Users/p.szymo/Documents/code_world/projects/library_usage_seattle/data/'
+# columns to load from the original checkouts CSV
+USECOLS = [
+    'Collection',
+    'ItemTitle',
+    'Subjects',
+    'CheckoutDateTime'
+]
 
+# preferred names of the loaded columns
+RENAME = [
+    'collection',
+    'title',
+    'subjects',
+    'date'
+]
 
-# status update
-status_update('Script has begun!')
+# datetime format of the original checkouts CSV
+CSV_DT_FORMAT = '%m/%d/%Y %I:%M:%S %p'
 
+# columns to dummy when aggregating daily counts
+DUMMY_COLS = [
+    'format_group',
+    'format_subgroup',
+    'category_group',
+    'age_group'
+]
 
-##----LOAD CHECKOUT DATA----##
+# pipeline stages, in the order they run
+STAGES = [
+    'ingest',
+    'transform',
+    'save',
+    'load',
+    'aggregate'
+]
 
-# columns to load
-usecols = [
-	'Collection',
-	'ItemTitle',
-	'Subjects',
-	'CheckoutDateTime'
-	]
 
-# load data
-df = pd.read_csv(
-	data_path + 'Checkouts_By_Title__Physical_Items_.csv',
-	usecols=usecols
-	)
+def ingest(csv_path, usecols=USECOLS, rename=RENAME):
+    '''
 
-# rename columns to my preferred format
-df.columns = [
-	'collection',
-	'title',
-	'subjects',
-	'date'
-	]
+    Function to load the original checkouts CSV.
 
-# status update
-status_update('Checkout data loaded!')
 
+    Input
+    -----
+    csv_path : str
+            File path of the checkouts CSV.
 
-##----CONVERT DATE COLUMN TO DATETIME----##
 
-# specify the format
-dt_format = '%m/%d/%Y %I:%M:%S %p'
+    Optional input
+    --------------
+    usecols : list (str)
+            Columns to load (default=`USECOLS`).
 
-# convert to datetime, dropping the hour-minute-second stamp using the `dt.date` attribute
-df['date'] = pd.to_datetime(df.date, format=dt_format).dt.date
+    rename : list (str)
+            New names of the loaded columns (default=`RENAME`).
 
 
-# status update
-status_update('Date column converted to datetime!')
+    Output
+    ------
+    df : Pandas DataFrame
+            Checkout data.
 
+    '''
 
-##----LOAD AND TRANSFORM DATA DICTIONARY----##
+    # load data
+    df = pd.read_csv(csv_path, usecols=usecols)
 
-# load data
-dd = pd.read_csv(data_path + 'data_dictionary.csv')
+    # rename columns to my preferred format
+    df.columns = rename
 
-# rename columns to my preferred format
-dd.columns = ['code', 'description', 'code_type', 'format_group', 'format_subgroup', 
-              'category_group', 'category_subgroup', 'age_group']
+    return df
 
-# subset to only collection codes
-dd = dd[dd.code_type == 'ItemCollection']
 
-# drop columns
-dd.drop(columns=['description', 'code_type', 'category_subgroup'], inplace=True)
+def transform(df, dd_path, dt_format=CSV_DT_FORMAT):
+    '''
 
-# list of columns to convert
-to_convert = ['format_group', 'format_subgroup', 'category_group', 'age_group']
+    Function to parse dates, merge with the data dictionary and lump categories
+    (see `data_transformer`).
 
-# convert to category datatype
-dd[to_convert] = dd[to_convert].apply(pd.Categorical)
 
+    Input
+    -----
+    df : Pandas DataFrame
+            Checkout data from `ingest`.
 
-# status update
-status_update('Data dictionary loaded and transformed!')
+    dd_path : str or Pandas DataFrame
+            File path of the data dictionary CSV, or the data dictionary already
+            prepped by `data_dict_prepper`.
 
 
-##----MERGE INFO----##
+    Optional input
+    --------------
+    dt_format : str
+            Datetime format of the date column (default=`CSV_DT_FORMAT`).
 
-# merge checkouts dataframe with info from data dictionary
-df_merged = df.merge(dd, left_on='collection', right_on='code')
 
+    Output
+    ------
+    df_merged : Pandas DataFrame
+            Transformed checkout data.
 
-# status update
-status_update('Checkout data merged with data dictionary info!')
+    '''
 
+    return data_transformer(df, dd_path, dt_format=dt_format)
 
-##----DROP UNNECESSARY COLUMNS----##
 
-# list of columns to keep
-keep_cols = ['title', 'subjects', 'date', 'format_group', 'format_subgroup',
-             'category_group', 'age_group']
+def aggregate(df, dummy_cols=DUMMY_COLS, date_col='date'):
+    '''
 
-# drop `collection` and `code` columns
-df_merged = df_merged[keep_cols]
+    Function to aggregate checkout data into daily counts: total checkouts, missing
+    titles and subjects, and checkouts per format, category and age group.
 
 
-# status update
-status_update('Collection and code columns dropped!')
+    Input
+    -----
+    df : Pandas DataFrame
+            Transformed checkout data.
 
 
-##----SET DATE COLUMN AS INDEX----##
+    Optional input
+    --------------
+    dummy_cols : list (str)
+            Columns to count by value (default=`DUMMY_COLS`).
 
-# set `date` column as index and sort by index
-df_merged = df_merged.set_index('date').sort_index()
+    date_col : str
+            Name of the date column (default='date').
 
-# status update
-status_update('Date is now the index!')
 
-# calculate and print number of rows and columns
-n_rows = df_merged.shape[0]
-n_cols = df_merged.shape[1]
+    Output
+    ------
+    df_counts : Pandas DataFrame
+            Daily counts, indexed by date.
 
-print(f'The dataframe contains {n_rows} rows and {n_cols} columns.')
+    '''
 
+    # date may be saved as the index
+    if date_col not in df.columns and df.index.name == date_col:
+        df = df.reset_index()
 
-##----SAVE----##
+    # `1` if title/subjects is missing, `0` if not
+    missing_df = pd.DataFrame({
+        'missing_title': df.title.isna().values.astype(np.int8),
+        'missing_subjects': df.subjects.isna().values.astype(np.int8)
+    }, index=df.index)
 
-# status update
-status_update('Trying to save...')
+    # dummy the columns and combine
+    dummy_df = pd.concat(
+        [missing_df, pd.get_dummies(df[dummy_cols], prefix=dummy_cols, dtype=np.int8)],
+        axis=1
+    )
 
-# loop through index and multiples of 10 million
-for ind, i in enumerate(range(0, 110000000, 10000000), 1):
-	
-	# save (via compressed pickle) a dataframe of 10 million rows, use index for unique file names
-	df_merged.iloc[i:i+10000000].to_pickle(f'{data_path}seattle_lib_{ind}.pkl', compression='gzip')
-    
-	# print status/time
-	status_update(f'File {ind} out of 11 saved successfully')\
+    # group by date and get category total for each column
+    df_counts = dummy_df.groupby(df[date_col].values).sum()
 
-# # compressed pickle
-# df_merged.to_pickle(data_path + 'seattle_lib.pkl', compression='gzip')
+    # combine with total checkouts per day
+    df_counts.insert(0, 'total_checkouts', df.groupby(date_col).size())
+    df_counts.index.name = date_col
 
-# with gzip.open(data_path + 'seattle_lib.pkl', 'wb') as goodbye:
-#     pickle.dump(df_merged, goodbye, protocol=pickle.HIGHEST_PROTOCOL)
+    return df_counts
 
-# status update
-status_update('Save successful!')
 
+def save(
+        df,
+        data_path,
+        file_prefix='seattle_lib_',
+        rows_per_file=10000000,
+        codec='gzip',
+        level=None,
+        n_jobs=None,
+        verbose=0):
+    '''
 
-##----LOAD----##
+    Function to save a DataFrame as multiple compressed Pickle files, readable
+    with `load_multi_df` (see `save_shards`).
 
-# print status/time
-status_update('Begin load...')
 
-# load first part
-df = pd.read_pickle('data/seattle_lib_1.pkl', compression='gzip')
+    Input
+    -----
+    df : Pandas DataFrame
+            Data to save.
 
-# print status/time
-status_update('File 1 loaded successfully.')
+    data_path : str
+            Pathway in which to save the files.
+            NOTE: Must end in '/'.
 
-# iterate through 2-11
-for i in range(2, 12):
 
-    # load parts 2-11
-    to_add = pd.read_pickle(f'data/seattle_lib_{i}.pkl', compression='gzip')
-    
-    # print status/time
-    status_update(f'File {i} loaded successfully.')
+    Optional input
+    --------------
+    file_prefix : str
+            Consistent prefix of each file (default='seattle_lib_').
 
-    # combine with previous part
-    df = pd.concat([df, to_add], ignore_index=True)
-    
-    # print status/time
-    status_update(f'Concatenation successful. DataFrame consists of files 1-{i}.')
-    
-# print status/time
-status_update('Load complete!')
\ No newline at end of file
+    rows_per_file : int
+            Maximum number of rows in each file (default=10000000, i.e. 10 million).
+
+    codec : str
+            Compression codec, e.g. 'gzip' or 'zstd' (default='gzip').
+
+    level : int
+            Compression level (default=None, i.e. the codec's default).
+
+    n_jobs : int
+            Number of files compressed at once (default=None, i.e. up to 4; see
+            `save_shards`).
+
+    verbose : int
+            Setting of status updates (including timestamps). Valid options are 0 or 1.
+
+
+    Output
+    ------
+    num_files : int
+            Number of files saved.
+
+    '''
+
+    # compress and save in parallel, with a manifest of checksums
+    manifest = save_shards(
+        df, data_path, file_prefix=file_prefix, rows_per_file=rows_per_file,
+        codec=codec, level=level, n_jobs=n_jobs, verbose=verbose
+    )
+
+    return len(manifest['files'])
+
+
+def count_files(data_path, file_prefix='seattle_lib_', ext='pkl'):
+    '''
+
+    Function to count sequentially numbered files, i.e. `file_1`, `file_2`, etc.
+
+    '''
+
+    # instantiate counter
+    num_files = 0
+
+    # count until the next file doesn't exist
+    while os.path.exists(f'{data_path}{file_prefix}{num_files + 1}.{ext}'):
+        num_files += 1
+
+    return num_files
+
+
+def run_pipeline(
+        stages,
+        data_path='data/',
+        csv_file='Checkouts_By_Title__Physical_Items_.csv',
+        dd_file='data_dictionary.csv',
+        file_prefix='seattle_lib_',
+        counts_file='seattle_lib_counts.pkl',
+        rows_per_file=10000000,
+        codec='gzip',
+        level=None,
+        n_jobs=None,
+        verbose=1):
+    '''
+
+    Function to run selected stages of the cleaning pipeline, in the order of
+    `STAGES`:
+        ingest    : load the original checkouts CSV
+        transform : parse dates, merge with the data dictionary and lump categories
+        save      : save checkout data as multiple compressed Pickle files
+        load      : load checkout data from the saved Pickle files
+        aggregate : aggregate checkout data into daily counts and save them
+
+
+    Input
+    -----
+    stages : list (str)
+            Stages to run.
+
+
+    Optional input
+    --------------
+    data_path : str
+            Pathway that contains the data files (default='data/').
+            NOTE: Must end in '/'.
+
+    csv_file : str
+            File name of the checkouts CSV
+            (default='Checkouts_By_Title__Physical_Items_.csv').
+
+    dd_file : str
+            File name of the data dictionary CSV (default='data_dictionary.csv').
+
+    file_prefix : str
+            Consistent prefix of each saved Pickle file (default='seattle_lib_').
+
+    counts_file : str
+            File name of the daily counts (default='seattle_lib_counts.pkl').
+
+    rows_per_file : int
+            Maximum number of rows in each saved Pickle file (default=10000000).
+
+    codec : str
+            Compression codec of saved Pickle files, e.g. 'gzip' or 'zstd'
+            (default='gzip').
+
+    level : int
+            Compression level (default=None, i.e. the codec's default).
+
+    n_jobs : int
+            Number of files compressed at once (default=None, i.e. up to 4; see
+            `save_shards`).
+
+    verbose : int
+            Setting of status updates (including timestamps). Valid options are 0 or 1.
+
+
+    Output
+    ------
+    df : Pandas DataFrame
+            Checkout data (None if no stage produced it).
+
+    df_counts : Pandas DataFrame
+            Daily counts (None if not aggregated).
+
+    '''
+
+    # check stage names
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f'Unknown stage(s): {sorted(unknown)}. Valid stages are {STAGES}.')
+
+    # instantiate as empty
+    df = None
+    df_counts = None
+
+    if 'ingest' in stages:
+        df = ingest(data_path + csv_file)
+
+        if verbose:
+            # print status/time
+            status_update(f'Checkout data loaded! Shape: {df.shape}')
+
+    if 'transform' in stages:
+        if df is None:
+            raise ValueError('The `transform` stage requires the `ingest` stage.')
+
+        df = transform(df, data_path + dd_file)
+
+        if verbose:
+            # print status/time
+            status_update(f'Checkout data transformed! Shape: {df.shape}')
+
+    if 'save' in stages:
+        if df is None:
+            raise ValueError('The `save` stage requires checkout data from earlier stages.')
+
+        num_files = save(
+            df, data_path, file_prefix, rows_per_file,
+            codec=codec, level=level, n_jobs=n_jobs, verbose=verbose
+        )
+
+        if verbose:
+            # print status/time
+            status_update(f'Save successful! {num_files} files saved.')
+
+    if 'load' in stages:
+
+        # number of files and codec from the manifest, if saved with one
+        manifest = load_manifest(data_path, file_prefix)
+        if manifest:
+            num_files = len(manifest['files'])
+            compression = manifest['codec']
+        else:
+            num_files = count_files(data_path, file_prefix)
+            compression = 'gzip'
+
+        df = load_multi_df(
+            data_path, file_prefix, 'pkl', num_files,
+            compression=compression, verbose=verbose
+        )
+
+    if 'aggregate' in stages:
+        if df is None:
+            raise ValueError('The `aggregate` stage requires checkout data from earlier stages.')
+
+        df_counts = aggregate(df)
+        df_counts.to_pickle(data_path + counts_file, compression='gzip')
+
+        if verbose:
+            # print status/time
+            status_update(f'Daily counts aggregated and saved! Shape: {df_counts.shape}')
+
+    return df, df_counts
+
+
+def ingest_transform(dd, csv_path, usecols=USECOLS, rename=RENAME, dt_format=CSV_DT_FORMAT):
+    '''
+
+    Function to load the original checkouts CSV and transform it with a prepped
+    data dictionary (the `transform` stage of `run_cached_pipeline`).
+
+    '''
+
+    return transform(ingest(csv_path, usecols=usecols, rename=rename), dd, dt_format=dt_format)
+
+
+def run_cached_pipeline(
+        data_path='data/',
+        cache_dir='data/cache/',
+        csv_file='Checkouts_By_Title__Physical_Items_.csv',
+        dd_file='data_dictionary.csv',
+        impute_window=2,
+        impute_unit='W',
+        outputs=('aggregate', 'impute'),
+        verbose=1):
+    '''
+
+    Function to run the cleaning-to-counts pipeline with each stage's output
+    cached under a hash of its inputs (see `cached_stage`):
+        data_dict : prep the data dictionary (`data_dict_prepper`)
+        transform : load the checkouts CSV and transform it (`data_transformer`)
+        aggregate : aggregate into daily counts (`aggregate`)
+        impute    : add and impute missing dates (`impute_date_gaps`)
+
+    A rerun only recomputes stages whose input files, parameters or code changed,
+    and the stages downstream of them. Stage keys are computed before any output
+    is loaded, so only the requested outputs (and the upstream outputs of stages
+    that must be recomputed) are loaded; in particular, the full `transform`
+    output is not loaded when its downstream stages are cached.
+
+
+    Optional input
+    --------------
+    data_path : str
+            Pathway that contains the data files (default='data/').
+            NOTE: Must end in '/'.
+
+    cache_dir : str
+            Folder in which to store stage outputs (default='data/cache/').
+
+    csv_file : str
+            File name of the checkouts CSV
+            (default='Checkouts_By_Title__Physical_Items_.csv').
+
+    dd_file : str
+            File name of the data dictionary CSV (default='data_dictionary.csv').
+
+    impute_window : int
+            Number of previous and future units used to impute (default=2).
+
+    impute_unit : str
+            Unit of time used to impute (default='W').
+
+    outputs : list (str)
+            Stages whose outputs to return (default=('aggregate', 'impute')).
+
+    verbose : int
+            Setting of status updates (including timestamps). Valid options are 0 or 1.
+
+
+    Output
+    ------
+    results : dict
+            Output of each requested stage, keyed by stage name.
+
+    '''
+
+    # file paths
+    csv_path = data_path + csv_file
+    dd_path = data_path + dd_file
+
+    # prep data dictionary
+    load_dd, dd_key = cached_stage(
+        cache_dir, 'data_dict', data_dict_prepper,
+        params={'file_path': dd_path},
+        input_files=[dd_path],
+        lazy=True,
+        verbose=verbose
+    )
+
+    # load and transform checkouts
+    load_df, df_key = cached_stage(
+        cache_dir, 'transform', ingest_transform,
+        args=(load_dd,),
+        params={
+            'csv_path': csv_path, 'usecols': USECOLS, 'rename': RENAME,
+            'dt_format': CSV_DT_FORMAT
+        },
+        input_files=[csv_path],
+        upstream=[dd_key],
+        helpers=[ingest, transform, data_transformer, transform_category],
+        lazy=True,
+        verbose=verbose
+    )
+
+    # aggregate daily counts
+    load_counts, counts_key = cached_stage(
+        cache_dir, 'aggregate', aggregate,
+        args=(load_df,),
+        params={'dummy_cols': DUMMY_COLS},
+        upstream=[df_key],
+        lazy=True,
+        verbose=verbose
+    )
+
+    # impute missing dates
+    load_imputed, _ = cached_stage(
+        cache_dir, 'impute', impute_date_gaps,
+        args=(load_counts,),
+        params={'window': impute_window, 'unit': impute_unit},
+        upstream=[counts_key],
+        helpers=[find_date_gaps],
+        lazy=True,
+        verbose=verbose
+    )
+
+    # loaders of each stage's output
+    loaders = {
+        'data_dict': load_dd,
+        'transform': load_df,
+        'aggregate': load_counts,
+        'impute': load_imputed
+    }
+
+    # load (or compute) requested outputs only
+    results = {name: loaders[name]() for name in outputs}
+
+    return results
+
+
+def main(argv=None):
+    '''
+
+    Command line entry point, e.g.:
+        python -m functions.data_transform ingest transform save --data-path data/
+
+    '''
+
+    # command line arguments
+    parser = argparse.ArgumentParser(
+        description='Run stages of the Seattle library checkouts cleaning pipeline.'
+    )
+    parser.add_argument('stages', nargs='+', choices=STAGES, help='stages to run')
+    parser.add_argument('--data-path', default='data/', help="data folder (must end in '/')")
+    parser.add_argument('--csv-file', default='Checkouts_By_Title__Physical_Items_.csv')
+    parser.add_argument('--dd-file', default='data_dictionary.csv')
+    parser.add_argument('--file-prefix', default='seattle_lib_')
+    parser.add_argument('--counts-file', default='seattle_lib_counts.pkl')
+    parser.add_argument('--rows-per-file', type=int, default=10000000)
+    parser.add_argument('--codec', default='gzip', choices=['gzip', 'bz2', 'xz', 'zstd'])
+    parser.add_argument('--level', type=int, default=None, help='compression level')
+    parser.add_argument('--jobs', type=int, default=None, help='files compressed at once (default: up to 4)')
+    parser.add_argument('--quiet', action='store_true', help='no status updates')
+    args = parser.parse_args(argv)
+
+    # run
+    run_pipeline(
+        args.stages,
+        data_path=args.data_path,
+        csv_file=args.csv_file,
+        dd_file=args.dd_file,
+        file_prefix=args.file_prefix,
+        counts_file=args.counts_file,
+        rows_per_file=args.rows_per_file,
+        codec=args.codec,
+        level=args.level,
+        n_jobs=args.jobs,
+        verbose=0 if args.quiet else 1
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+# standard dataframe packages
+import pandas as pd
+import numpy as np
+
+# parallel processing packages
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+# statistical packages
+import warnings
+
+# caching packages
+import hashlib
+
+from functions.pipeline_cache import cached_stage
+
+
+def acf_matrix(series, nlags=21):
+    '''
+
+    Function to compute the autocorrelation function of many series at once via
+    FFT. Series may have different lengths (shorter ones are zero-padded after
+    demeaning, which leaves their autocorrelations unchanged).
+
+
+    Input
+    -----
+    series : list (NumPy array)
+            Series without missing values.
+
+
+    Optional input
+    --------------
+    nlags : int
+            Number of lags to return (default=21).
+
+
+    Output
+    ------
+    acf : NumPy array
+            Autocorrelations with shape (nlags + 1, number of series), matching
+            `statsmodels.tsa.stattools.acf` with `adjusted=False`.
+
+    '''
+
+    # longest series
+    n = max(len(values) for values in series)
+
+    # demeaned series as columns, zero-padded to the same length
+    matrix = np.zeros((n, len(series)))
+    for i, values in enumerate(series):
+        matrix[:len(values), i] = values - np.mean(values)
+
+    # FFT length: at least 2n to avoid circular overlap, rounded up for speed
+    n_fft = 1 << int(np.ceil(np.log2(2 * n - 1)))
+
+    # autocovariances via the power spectrum of every column at once
+    spectrum = np.fft.rfft(matrix, n=n_fft, axis=0)
+    autocov = np.fft.irfft(spectrum * np.conj(spectrum), n=n_fft, axis=0)[:nlags + 1]
+
+    # normalize by lag 0 (constant series get NaN)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        acf = autocov / autocov[0]
+
+    return acf
+
+
+def pacf_from_acf(acf):
+    '''
+
+    Function to compute the partial autocorrelation function of many series at
+    once from their autocorrelations, via the Durbin-Levinson recursion. From the
+    output of `acf_matrix`, this matches `statsmodels.tsa.stattools.pacf` with
+    `method='ldb'` (or 'ywm'), not its default 'ywadjusted'.
+
+
+    Input
+    -----
+    acf : NumPy array
+            Autocorrelations with shape (nlags + 1, number of series).
+
+
+    Output
+    ------
+    pacf : NumPy array
+            Partial autocorrelations with the same shape (lag 0 is 1).
+
+    '''
+
+    # number of lags and series
+    nlags = acf.shape[0] - 1
+
+    # instantiate outputs
+    pacf = np.ones_like(acf)
+
+    # AR coefficients of the previous order, one column per series
+    phi = np.zeros((0, acf.shape[1]))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+
+        # loop through orders
+        for k in range(1, nlags + 1):
+
+            # reflection coefficient of order k
+            numerator = acf[k] - np.sum(phi * acf[k - 1:0:-1], axis=0)
+            denominator = 1 - np.sum(phi * acf[1:k], axis=0)
+            reflection = numerator / denominator
+
+            # update AR coefficients
+            phi = np.vstack([phi - reflection * phi[::-1], reflection])
+
+            pacf[k] = reflection
+
+    return pacf
+
+
+def stationarity_tests(values):
+    '''
+
+    Function to run Augmented Dickey-Fuller and KPSS tests on one series.
+
+
+    Input
+    -----
+    values : NumPy array
+            Series without missing values.
+
+
+    Output
+    ------
+    results : dict
+            ADF statistic, p-value, lags used and observations used, and KPSS
+            statistic and p-value (NaN if a test fails, e.g. on a constant series).
+
+    '''
+
+    # statistical packages
+    from statsmodels.tsa.stattools import adfuller, kpss
+
+    # instantiate with missing values
+    results = {
+        'adf_stat': np.nan, 'adf_pvalue': np.nan, 'adf_lags': np.nan, 'adf_nobs': np.nan,
+        'kpss_stat': np.nan, 'kpss_pvalue': np.nan
+    }
+
+    # run dickey-fuller test (degenerate slices only trigger warnings)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            adf = adfuller(values)
+        results.update(zip(['adf_stat', 'adf_pvalue', 'adf_lags', 'adf_nobs'], adf[:4]))
+    except (ValueError, np.linalg.LinAlgError):
+        pass
+
+    # run kpss test (p-values outside its lookup table only trigger a warning)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            stat, pvalue, _, _ = kpss(values, nlags='auto')
+        results.update({'kpss_stat': stat, 'kpss_pvalue': pvalue})
+    except (ValueError, OverflowError, np.linalg.LinAlgError):
+        pass
+
+    return results
+
+
+def series_slices(df, cols=None, by_year=True, diffs=(0, 1)):
+    '''
+
+    Function to split count columns into slices for diagnostics: every column,
+    for the full period and (optionally) each year, at each differencing order.
+
+
+    Input
+    -----
+    df : Pandas DataFrame
+            Daily counts indexed by date.
+
+
+    Optional input
+    --------------
+    cols : list (str)
+            Columns to slice (default=None, i.e. all columns).
+
+    by_year : bool
+            Whether or not to add a slice for each year (default=True).
+
+    diffs : list (int)
+            Differencing orders (default=(0, 1)).
+
+
+    Output
+    ------
+    slices : dict
+            (column, period, diff) mapped to NumPy arrays without missing values,
+            where period is 'all' or a year.
+
+    '''
+
+    # make sure the index is datetime
+    df = df.copy()
+    df.index = pd.DatetimeIndex(pd.to_datetime(df.index))
+
+    # columns to slice
+    if cols is None:
+        cols = list(df.columns)
+
+    # full period, then each year
+    periods = [('all', df)]
+    if by_year:
+        periods += [(year, group) for year, group in df.groupby(df.index.year)]
+
+    # instantiate empty dictionary
+    slices = {}
+
+    # loop through slices
+    for period, data in periods:
+        for d in diffs:
+
+            # differenced data
+            differenced = data[cols]
+            for _ in range(d):
+                differenced = differenced.diff()
+
+            for col in cols:
+                slices[(col, period, d)] = differenced[col].dropna().to_numpy(dtype=float)
+
+    return slices
+
+
+def _compute_diagnostics(df, n_jobs=None, cols=None, by_year=True, diffs=(0, 1), nlags=21):
+    '''
+
+    Function to compute the diagnostics tables (see `run_diagnostics`).
+
+    '''
+
+    # slices to test, with periods as strings ('all' or the year) in both tables
+    slices = series_slices(df, cols=cols, by_year=by_year, diffs=diffs)
+    slices = {(col, str(period), d): values for (col, period, d), values in slices.items()}
+
+    # skip slices too short to test
+    slices = {key: values for key, values in slices.items() if len(values) > nlags + 2}
+    keys = list(slices)
+
+    # stationarity tests in parallel
+    if n_jobs == 1:
+        tests = [stationarity_tests(slices[key]) for key in keys]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count()) as executor:
+            tests = list(executor.map(
+                stationarity_tests, [slices[key] for key in keys], chunksize=16
+            ))
+
+    # tidy table of test results
+    index = pd.MultiIndex.from_tuples(keys, names=['series', 'period', 'diff'])
+    tests = pd.DataFrame(tests, index=index)
+    tests.insert(0, 'n_obs', [len(slices[key]) for key in keys])
+
+    # correlations of all slices at once
+    acf = acf_matrix([slices[key] for key in keys], nlags=nlags)
+    pacf = pacf_from_acf(acf)
+
+    # tidy (long) table of correlations
+    correlations = pd.DataFrame({
+        'series': np.repeat([key[0] for key in keys], nlags + 1),
+        'period': np.repeat([key[1] for key in keys], nlags + 1),
+        'diff': np.repeat([key[2] for key in keys], nlags + 1),
+        'lag': np.tile(np.arange(nlags + 1), len(keys)),
+        'acf': acf.T.ravel(),
+        'pacf': pacf.T.ravel()
+    })
+
+    return tests.reset_index(), correlations
+
+
+def run_diagnostics(
+        df,
+        cols=None,
+        by_year=True,
+        diffs=(0, 1),
+        nlags=21,
+        cache_dir=None,
+        n_jobs=None,
+        verbose=0):
+    '''
+
+    Function to run stationarity tests (ADF and KPSS) and compute ACF/PACF for
+    every count column, for the full period and each year, at each differencing
+    order. Tests run in parallel; ACF is computed via FFT over all slices at once,
+    and PACF from it via Durbin-Levinson (statsmodels' `pacf` with `method='ldb'`).
+
+
+    Input
+    -----
+    df : Pandas DataFrame
+            Daily counts indexed by date (e.g. imputed counts).
+
+
+    Optional input
+    --------------
+    cols : list (str)
+            Columns to test (default=None, i.e. all columns).
+
+    by_year : bool
+            Whether or not to test each year separately as well (default=True).
+
+    diffs : list (int)
+            Differencing orders (default=(0, 1)).
+
+    nlags : int
+            Number of ACF/PACF lags (default=21).
+
+    cache_dir : str
+            Folder in which to cache results, keyed by a hash of the data and
+            parameters (default=None, i.e. no caching).
+
+    n_jobs : int
+            Number of worker processes (default=None, i.e. number of CPUs).
+            If 1, tests run one at a time in the current process.
+
+    verbose : int
+            Setting of status updates (including timestamps). Valid options are 0 or 1.
+
+
+    Output
+    ------
+    tests : Pandas DataFrame
+            One row per (series, period, diff) with number of observations and
+            ADF/KPSS statistics and p-values. Periods are strings ('all' or the
+            year), as in `correlations`, so the tables join on these columns.
+
+    correlations : Pandas DataFrame
+            One row per (series, period, diff, lag) with ACF and PACF values.
+
+    '''
+
+    # parameters of the computation (the number of workers doesn't change results)
+    params = {'cols': cols, 'by_year': by_year, 'diffs': list(diffs), 'nlags': nlags}
+
+    # compute without caching
+    if not cache_dir:
+        return _compute_diagnostics(df, n_jobs, **params)
+
+    # checksum of the data, so changed counts are recomputed
+    data_hash = hashlib.sha256(
+        pd.util.hash_pandas_object(df).to_numpy().tobytes()
+        + ','.join(map(str, df.columns)).encode('utf-8')
+    ).hexdigest()
+
+    # load cached results or compute them
+    (tests, correlations), _ = cached_stage(
+        cache_dir, 'diagnostics', _compute_diagnostics,
+        args=(df, n_jobs),
+        params=params,
+        upstream=[data_hash],
+        helpers=[series_slices, stationarity_tests, acf_matrix, pacf_from_acf],
+        verbose=verbose
+    )
+
+    return tests, correlations
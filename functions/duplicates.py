@@ -0,0 +1,388 @@
+# standard dataframe packages
+import pandas as pd
+import numpy as np
+
+from functions.data_cleaning import status_update
+
+
+# columns of the original checkouts CSV that identify a single checkout event
+CSV_DUPLICATE_COLS = [
+    'Collection',
+    'ItemTitle',
+    'Subjects',
+    'CheckoutDateTime'
+]
+
+
+def row_fingerprints(df, cols=None, index=None):
+    '''
+
+    Function to hash each row of a DataFrame into a 64-bit fingerprint, so rows can
+    be compared as integers instead of as (object) strings.
+
+    NOTE: With 64-bit hashes, the chance of any collision across ~100 million
+    distinct rows is roughly 1 in 3,500.
+
+
+    Input
+    -----
+    df : Pandas DataFrame
+            Data to fingerprint.
+
+
+    Optional input
+    --------------
+    cols : list (str)
+            Columns to include in the fingerprint (default=None, i.e. all columns).
+
+    index : bool
+            Whether or not to include the index in the fingerprint (default=None,
+            i.e. only if the index is named, such as a `date` index).
+
+
+    Output
+    ------
+    fingerprints : NumPy array (uint64)
+            One fingerprint per row.
+
+    '''
+
+    # all columns by default
+    if cols is not None:
+        df = df[cols]
+
+    # include index only if it holds data (e.g. `date`)
+    if index is None:
+        index = df.index.name is not None
+
+    # vectorized hash of each row
+    fingerprints = pd.util.hash_pandas_object(df, index=index).to_numpy()
+
+    return fingerprints
+
+
+def fingerprint_counts(fingerprints):
+    '''
+
+    Function to count occurrences of each fingerprint by sorting.
+
+
+    Input
+    -----
+    fingerprints : NumPy array (uint64)
+            Row fingerprints (see `row_fingerprints`).
+
+
+    Output
+    ------
+    unique : NumPy array (uint64)
+            Sorted, unique fingerprints.
+
+    counts : NumPy array (int64)
+            Number of rows with each fingerprint.
+
+    '''
+
+    # sort-based unique with counts
+    unique, counts = np.unique(fingerprints, return_counts=True)
+
+    return unique, counts
+
+
+def merge_fingerprint_counts(parts):
+    '''
+
+    Function to combine fingerprint counts from multiple shards or chunks.
+
+
+    Input
+    -----
+    parts : list (tuple)
+            List of (unique, counts) pairs (see `fingerprint_counts`).
+
+
+    Output
+    ------
+    unique : NumPy array (uint64)
+            Sorted, unique fingerprints across all parts.
+
+    counts : NumPy array (int64)
+            Total number of rows with each fingerprint across all parts.
+
+    '''
+
+    # stack all parts
+    all_unique = np.concatenate([part[0] for part in parts])
+    all_counts = np.concatenate([part[1] for part in parts])
+
+    # sort-based unique, keeping track of where each fingerprint went
+    unique, inverse = np.unique(all_unique, return_inverse=True)
+
+    # sum counts of matching fingerprints
+    counts = np.bincount(inverse, weights=all_counts, minlength=len(unique)).astype(np.int64)
+
+    return unique, counts
+
+
+def duplicate_report(unique, counts):
+    '''
+
+    Function to summarize duplicates from fingerprint counts.
+
+
+    Input
+    -----
+    unique : NumPy array (uint64)
+            Sorted, unique fingerprints.
+
+    counts : NumPy array (int64)
+            Number of rows with each fingerprint.
+
+
+    Output
+    ------
+    report : Pandas Series
+            Total rows, unique rows, duplicate rows (rows beyond the first of each
+            group), rows in duplicate groups (as with `duplicated(keep=False)`),
+            number of duplicate groups, and size of the largest group.
+
+    '''
+
+    # groups with more than one row
+    dupes = counts > 1
+
+    report = pd.Series({
+        'rows': int(counts.sum()),
+        'unique_rows': len(unique),
+        'duplicate_rows': int(counts.sum() - len(unique)),
+        'rows_in_duplicate_groups': int(counts[dupes].sum()),
+        'duplicate_groups': int(dupes.sum()),
+        'largest_group': int(counts.max()) if len(counts) else 0
+    })
+
+    return report
+
+
+def find_csv_duplicates(
+        csv_path,
+        cols=CSV_DUPLICATE_COLS,
+        chunksize=5000000,
+        verbose=0):
+    '''
+
+    Function to count duplicate checkouts in the original checkouts CSV, reading
+    it in chunks. Each chunk is reduced to fingerprint counts, which are then
+    merged across chunks.
+
+    This is the way to count data-quality duplicates: by default, a duplicate is
+    a row with the same collection code, title, subjects and exact checkout
+    timestamp. (The saved shards only keep the day, without the collection code
+    or time, so repeat checkouts of a title on the same day look identical there.)
+
+
+    Input
+    -----
+    csv_path : str
+            File path of the checkouts CSV.
+
+
+    Optional input
+    --------------
+    cols : list (str)
+            Columns of the CSV that define a duplicate
+            (default=`CSV_DUPLICATE_COLS`).
+
+    chunksize : int
+            Number of rows read at a time (default=5000000).
+
+    verbose : int
+            Setting of status updates (including timestamps). Valid options are 0 or 1.
+
+
+    Output
+    ------
+    report : Pandas Series
+            Summary of duplicates (see `duplicate_report`).
+
+    dupes : Pandas Series
+            Number of rows for each duplicated fingerprint, indexed by fingerprint.
+
+    '''
+
+    # instantiate empty list
+    parts = []
+
+    # read as strings so every chunk hashes the same way (timestamps stay exact)
+    reader = pd.read_csv(csv_path, usecols=cols, dtype=str, chunksize=chunksize)
+
+    # iterate through chunks
+    for i, chunk in enumerate(reader, 1):
+
+        # reduce to fingerprint counts, then release the chunk
+        parts.append(fingerprint_counts(row_fingerprints(chunk, cols=cols, index=False)))
+        del chunk
+
+        if verbose:
+            # print status/time
+            status_update(f'Chunk {i} fingerprinted successfully.')
+
+    # combine across chunks
+    unique, counts = merge_fingerprint_counts(parts)
+
+    # summarize
+    report = duplicate_report(unique, counts)
+
+    # duplicated fingerprints only
+    dupes = pd.Series(counts[counts > 1], index=unique[counts > 1])
+
+    return report, dupes
+
+
+def find_duplicates(
+        data_path,
+        file_prefix,
+        ext,
+        num_files,
+        cols,
+        compression='infer',
+        verbose=0):
+    '''
+
+    Function to count rows that share the values of chosen columns across multiple
+    Pickle files (shards) without loading them all at once. Each shard is reduced
+    to fingerprint counts, which are then merged across shards.
+
+    NOTE: The shards only keep the checkout day, without the collection code or
+    time, so repeat checkouts of the same title on the same day match here. To
+    count data-quality duplicates, use `find_csv_duplicates` on the original CSV.
+
+    NOTE: Files must have the same naming structure as for `load_multi_df`.
+
+
+    Input
+    -----
+    data_path : str
+            Pathway that contains the files to load.
+            NOTE: Must end in '/'.
+
+    file_prefix : str
+            Consistent prefix of each file.
+
+    ext : str
+            Extension of the files (without a leading dot).
+
+    num_files : int
+            Number of files to load.
+
+    cols : list (str)
+            Columns that define a match (a named index, such as `date`, is
+            included as well).
+
+
+    Optional input
+    --------------
+    compression : str
+            String denoting type of compression, if any (default='infer').
+
+    verbose : int
+            Setting of status updates (including timestamps). Valid options are 0 or 1.
+
+
+    Output
+    ------
+    report : Pandas Series
+            Summary of duplicates (see `duplicate_report`).
+
+    dupes : Pandas Series
+            Number of rows for each duplicated fingerprint, indexed by fingerprint.
+
+    '''
+
+    # columns must be chosen explicitly
+    if not cols:
+        raise ValueError('`cols` must list the columns that define a match.')
+
+    # instantiate empty list
+    parts = []
+
+    # iterate through files
+    for i in range(1, num_files + 1):
+
+        # load one shard
+        df = pd.read_pickle(
+            f'{data_path}{file_prefix}{i}.{ext}',
+            compression=compression)
+
+        # reduce to fingerprint counts, then release the shard
+        parts.append(fingerprint_counts(row_fingerprints(df, cols=cols)))
+        del df
+
+        if verbose:
+            # print status/time
+            status_update(f'File {i} fingerprinted successfully.')
+
+    # combine across shards
+    unique, counts = merge_fingerprint_counts(parts)
+
+    # summarize
+    report = duplicate_report(unique, counts)
+
+    # duplicated fingerprints only
+    dupes = pd.Series(counts[counts > 1], index=unique[counts > 1])
+
+    return report, dupes
+
+
+def drop_duplicate_rows(df, cols=None, seen=None):
+    '''
+
+    Function to drop duplicate rows from a DataFrame (keeping the first occurrence),
+    as well as rows already seen in previous shards or chunks.
+
+
+    Input
+    -----
+    df : Pandas DataFrame
+            Data from which to drop duplicates.
+
+
+    Optional input
+    --------------
+    cols : list (str)
+            Columns that define a duplicate (default=None, i.e. all columns).
+
+    seen : NumPy array (uint64)
+            Sorted fingerprints kept from previous shards (default=None).
+
+
+    Output
+    ------
+    df_unique : Pandas DataFrame
+            Data without duplicate rows.
+
+    seen : NumPy array (uint64)
+            Sorted fingerprints kept so far, to pass with the next shard.
+
+    '''
+
+    # fingerprint rows
+    fingerprints = row_fingerprints(df, cols=cols)
+
+    # position of the first occurrence of each fingerprint
+    _, first = np.unique(fingerprints, return_index=True)
+
+    # keep first occurrences
+    keep = np.zeros(len(df), dtype=bool)
+    keep[first] = True
+
+    # drop rows kept in previous shards
+    if seen is not None:
+        keep &= ~np.isin(fingerprints, seen)
+        seen = np.union1d(seen, fingerprints[keep])
+    else:
+        seen = np.sort(fingerprints[keep])
+
+    # subset
+    df_unique = df[keep]
+
+    return df_unique, seen
@@ -2,12 +2,26 @@
 import pandas as pd
 import numpy as np
 
-# graphing packages
-import matplotlib.pyplot as plt
-import seaborn as sns; sns.set_style('ticks')
 
-# time-related packages
-from statsmodels.tsa.seasonal import seasonal_decompose
+def _pyplot():
+    '''
+
+    Function to import matplotlib (with the seaborn style) only when a plot is made,
+    so that importing this module stays fast.
+
+
+    Output
+    ------
+    plt : module
+            `matplotlib.pyplot`.
+
+    '''
+
+    # graphing packages
+    import matplotlib.pyplot as plt
+    import seaborn as sns; sns.set_style('ticks')
+
+    return plt
 
 
 def ts_decompose(target, save=False, filepath='ts_decompose.png'):
@@ -39,6 +53,12 @@ def ts_decompose(target, save=False, filepath='ts_decompose.png'):
     '''
 
 
+    # graphing packages
+    plt = _pyplot()
+
+    # time-related packages
+    from statsmodels.tsa.seasonal import seasonal_decompose
+
     # decompose data
     decomposition = seasonal_decompose(target)
 
@@ -152,6 +172,9 @@ def ts_rolling(
         Resultant plot (also printed).
 
     '''
+    # graphing packages
+    plt = _pyplot()
+
     # period is an integer
     if type(period) == int:
         # determine rolling statistics
@@ -0,0 +1,306 @@
+# standard dataframe packages
+import pandas as pd
+
+# caching packages
+import hashlib
+import inspect
+import json
+import os
+
+from functions.data_cleaning import status_update
+
+
+def file_digest(file_path, memo_path=None):
+    '''
+
+    Function to compute the SHA-256 checksum of a file's contents. Checksums are
+    remembered by (path, size, modification time), so unchanged files (such as the
+    multi-gigabyte checkouts CSV) are only read once.
+
+
+    Input
+    -----
+    file_path : str
+            File to checksum.
+
+
+    Optional input
+    --------------
+    memo_path : str
+            JSON file in which to remember checksums (default=None, i.e. don't
+            remember).
+
+
+    Output
+    ------
+    digest : str
+            Hexadecimal checksum.
+
+    '''
+
+    # identify this version of the file without reading it
+    stat = os.stat(file_path)
+    memo_key = f'{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}'
+
+    # remembered checksums
+    memo = {}
+    if memo_path and os.path.exists(memo_path):
+        with open(memo_path) as f:
+            memo = json.load(f)
+
+    if memo_key in memo:
+        return memo[memo_key]
+
+    # checksum in chunks to limit memory
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 24), b''):
+            sha.update(block)
+    digest = sha.hexdigest()
+
+    # remember
+    if memo_path:
+        memo[memo_key] = digest
+        with open(memo_path + '.tmp', 'w') as f:
+            json.dump(memo, f, indent=2)
+        os.replace(memo_path + '.tmp', memo_path)
+
+    return digest
+
+
+def function_version(func):
+    '''
+
+    Function to identify the current version of a function by a checksum of its
+    source code (or its name, if the source isn't available).
+
+    '''
+
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = f'{func.__module__}.{func.__qualname__}'
+
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def stage_key(
+        name,
+        func,
+        version=None,
+        input_files=(),
+        params=None,
+        upstream=(),
+        helpers=(),
+        memo_path=None):
+    '''
+
+    Function to compute the cache key of a pipeline stage from everything its
+    output depends on: its name, function version, input file contents,
+    parameters and the keys of upstream stages.
+
+
+    Input
+    -----
+    name : str
+            Name of the stage.
+
+    func : function
+            Function that computes the stage's output.
+
+
+    Optional input
+    --------------
+    version : str or int
+            Version of the stage (default=None, i.e. a checksum of `func`'s
+            source code, so any edit invalidates the cache).
+
+    input_files : list (str)
+            Files the stage reads (default=()).
+
+    params : dict
+            Parameters of the stage; must be JSON-serializable or have a stable
+            string representation (default=None).
+
+    upstream : list (str)
+            Cache keys of the stages whose outputs this stage uses (default=()).
+
+    helpers : list (function)
+            Other functions called by `func` whose source is part of the default
+            version (default=()).
+
+    memo_path : str
+            JSON file in which to remember file checksums (default=None).
+
+
+    Output
+    ------
+    key : str
+            Hexadecimal cache key.
+
+    '''
+
+    # default version from the source of the function and its helpers
+    if version is None:
+        version = [function_version(f) for f in [func] + list(helpers)]
+
+    # everything the output depends on
+    description = json.dumps(
+        {
+            'name': name,
+            'version': version,
+            'input_files': [file_digest(path, memo_path) for path in input_files],
+            'params': params or {},
+            'upstream': list(upstream)
+        },
+        sort_keys=True,
+        default=str
+    )
+
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+
+def stage_path(cache_dir, name, key):
+    '''
+
+    Function to build the file path of a stage's stored output.
+
+    '''
+
+    return os.path.join(cache_dir, f'{name}_{key[:16]}.pkl')
+
+
+def cached_stage(
+        cache_dir,
+        name,
+        func,
+        args=(),
+        params=None,
+        input_files=(),
+        upstream=(),
+        helpers=(),
+        version=None,
+        compression='gzip',
+        lazy=False,
+        verbose=0):
+    '''
+
+    Function to run a pipeline stage, or load its output if the stage has already
+    been run with the same inputs. Outputs are stored under a hash of the input
+    file contents, parameters, function version and upstream stage keys, so a
+    change anywhere only recomputes the stages downstream of it.
+
+    With `lazy=True`, nothing is loaded or computed until the returned loader is
+    called, and upstream outputs are passed as loaders too. Since keys only depend
+    on upstream keys, a chain of lazy stages only loads the outputs it needs: a
+    cached stage never loads its upstream outputs.
+
+
+    Input
+    -----
+    cache_dir : str
+            Folder in which to store stage outputs.
+
+    name : str
+            Name of the stage.
+
+    func : function
+            Function that computes the stage's output, called as
+            `func(*args, **params)`.
+
+
+    Optional input
+    --------------
+    args : tuple
+            Positional arguments, typically upstream outputs; they are not hashed,
+            so their stages' keys must be passed as `upstream` (default=()).
+            With `lazy=True`, each must be a function without arguments that
+            returns the value (e.g. the loader of an upstream lazy stage).
+
+    params : dict
+            Keyword arguments, hashed as part of the key (default=None).
+
+    input_files : list (str)
+            Files the stage reads, hashed by content (default=()).
+
+    upstream : list (str)
+            Cache keys of the stages whose outputs are in `args` (default=()).
+
+    helpers : list (function)
+            Other functions called by `func` whose source is part of the default
+            version (default=()).
+
+    version : str or int
+            Version of the stage (default=None, i.e. a checksum of `func`'s source).
+
+    compression : str
+            Compression of stored outputs (default='gzip').
+
+    lazy : bool
+            Whether to return a loader instead of the output (default=False).
+
+    verbose : int
+            Setting of status updates (including timestamps). Valid options are 0 or 1.
+
+
+    Output
+    ------
+    output : object
+            Output of the stage, or with `lazy=True`, a function without
+            arguments that loads (or computes) it once and returns it.
+
+    key : str
+            Cache key of the stage, to pass as `upstream` to later stages.
+
+    '''
+
+    # make sure the cache folder exists
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # key from all inputs
+    key = stage_key(
+        name, func, version=version, input_files=input_files, params=params,
+        upstream=upstream, helpers=helpers,
+        memo_path=os.path.join(cache_dir, 'file_digests.json')
+    )
+
+    # stored output
+    file_path = stage_path(cache_dir, name, key)
+
+    # output, once loaded or computed
+    result = []
+
+    def load():
+
+        if result:
+            return result[0]
+
+        # load if already computed
+        if os.path.exists(file_path):
+            output = pd.read_pickle(file_path, compression=compression)
+
+            if verbose:
+                # print status/time
+                status_update(f'Stage `{name}` loaded from cache.')
+
+        else:
+            # compute (loading upstream outputs only now)
+            stage_args = [arg() for arg in args] if lazy else args
+            output = func(*stage_args, **(params or {}))
+
+            # save via a temporary file so partial writes are never read
+            pd.to_pickle(output, file_path + '.tmp', compression=compression)
+            os.replace(file_path + '.tmp', file_path)
+
+            if verbose:
+                # print status/time
+                status_update(f'Stage `{name}` computed and cached.')
+
+        result.append(output)
+
+        return output
+
+    if lazy:
+        return load, key
+
+    return load(), key
@@ -0,0 +1,522 @@
+# standard dataframe packages
+import pandas as pd
+import numpy as np
+
+# parallel processing packages
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from functions.data_cleaning import status_update
+
+
+# number of bits used to pick a HyperLogLog register (2^14 registers, ~0.8% error)
+HLL_PRECISION = 14
+
+# number of heavy-hitter counters kept per column
+TOP_K = 100
+
+
+def hll_ranks(values, precision=HLL_PRECISION):
+    '''
+
+    Function to hash each value into a HyperLogLog register and rank, so that
+    sketches can be built per value, per group or per chunk.
+
+
+    Input
+    -----
+    values : Pandas Series
+            Values to sketch (without nulls).
+
+
+    Optional input
+    --------------
+    precision : int
+            Number of hash bits used to pick a register (default=`HLL_PRECISION`).
+
+
+    Output
+    ------
+    idx : NumPy array (int64)
+            Register of each value.
+
+    rank : NumPy array (uint8)
+            Position of the first 1 bit in the rest of each value's hash.
+
+    '''
+
+    # 64-bit hash of each value
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+    # first `precision` bits pick the register
+    idx = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+
+    # remaining bits, shifted to the top
+    rest = hashes << np.uint64(precision)
+
+    # count leading zeros, 32 bits at a time so float log2 is exact
+    hi = (rest >> np.uint64(32)).astype(np.float64)
+    lo = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide='ignore'):
+        leading_zeros = np.where(
+            hi > 0,
+            31 - np.floor(np.log2(hi)),
+            np.where(lo > 0, 63 - np.floor(np.log2(lo)), 64)
+        )
+
+    # rank = position of the first 1 bit
+    rank = np.minimum(leading_zeros + 1, 64 - precision + 1).astype(np.uint8)
+
+    return idx, rank
+
+
+def hll_registers(values, precision=HLL_PRECISION):
+    '''
+
+    Function to build HyperLogLog registers (a distinct-count sketch) for a set of
+    values. Registers from different chunks can be merged with `np.maximum`.
+
+
+    Input
+    -----
+    values : Pandas Series
+            Values to sketch (nulls are ignored).
+
+
+    Optional input
+    --------------
+    precision : int
+            Number of hash bits used to pick a register (default=`HLL_PRECISION`).
+
+
+    Output
+    ------
+    registers : NumPy array (uint8)
+            Maximum rank observed in each of the 2^precision registers.
+
+    '''
+
+    # register and rank of each non-null value
+    idx, rank = hll_ranks(values.dropna(), precision=precision)
+
+    # keep the maximum rank per register
+    registers = np.zeros(2 ** precision, dtype=np.uint8)
+    np.maximum.at(registers, idx, rank)
+
+    return registers
+
+
+def hll_estimate(registers):
+    '''
+
+    Function to estimate the number of distinct values from HyperLogLog registers.
+
+
+    Input
+    -----
+    registers : NumPy array (uint8)
+            Registers from `hll_registers`.
+
+
+    Output
+    ------
+    estimate : int
+            Estimated number of distinct values.
+
+    '''
+
+    # number of registers
+    m = len(registers)
+
+    # bias correction constant
+    alpha = 0.7213 / (1 + 1.079 / m)
+
+    # raw estimate (harmonic mean of register values)
+    estimate = alpha * m ** 2 / np.sum(2.0 ** -registers.astype(np.float64))
+
+    # small range correction (linear counting)
+    zeros = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * np.log(m / zeros)
+
+    return int(round(estimate))
+
+
+def merge_heavy_hitters(a, b, top_k=TOP_K):
+    '''
+
+    Function to merge two heavy-hitter summaries (mergeable Misra-Gries counters),
+    keeping at most `top_k` values. Counts are lower bounds; starting from the
+    exact top values of each chunk (see `profile_frame`), each is off by at most
+    2 * (total count / (top_k + 1)).
+
+
+    Input
+    -----
+    a : Pandas Series
+            Counts indexed by value.
+
+    b : Pandas Series
+            Counts indexed by value.
+
+
+    Optional input
+    --------------
+    top_k : int
+            Number of counters to keep (default=`TOP_K`).
+
+
+    Output
+    ------
+    merged : Pandas Series
+            Counts indexed by value, sorted in descending order.
+
+    '''
+
+    # sum counters of matching values
+    merged = a.add(b, fill_value=0).sort_values(ascending=False)
+
+    # too many counters: subtract the (top_k + 1)th count and drop non-positive ones
+    if len(merged) > top_k:
+        merged = merged.iloc[:top_k] - merged.iloc[top_k]
+        merged = merged[merged > 0]
+
+    return merged.astype(np.int64)
+
+
+def _has_order(series):
+    '''
+
+    Function to determine whether min/max are meaningful for a column
+    (numbers, datetimes, or Python dates).
+
+    '''
+
+    # numeric and datetime columns
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return not pd.api.types.is_bool_dtype(series)
+
+    # object columns of Python dates (e.g. `date` after `dt.date`)
+    if series.dtype == object:
+        first = series.dropna()[:1]
+        return len(first) > 0 and hasattr(first.iloc[0], 'toordinal')
+
+    return False
+
+
+def _normalize_bound(value):
+    '''
+
+    Function to convert date-like min/max values (Python dates, datetimes,
+    NumPy datetimes) to Pandas Timestamps, so bounds from chunks with different
+    date types can be compared when merging.
+
+    '''
+
+    if isinstance(value, (pd.Timestamp, np.datetime64)) or hasattr(value, 'toordinal'):
+        return pd.Timestamp(value)
+
+    return value
+
+
+def _normalize_dates(values):
+    '''
+
+    Function to convert date-like values (datetimes of any unit, or Python dates)
+    to `datetime64[ns]`, so the same day hashes and counts the same way whatever
+    type a chunk stores it as. Other values are returned unchanged.
+
+    '''
+
+    # datetimes of another unit (e.g. `datetime64[us]`)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.as_unit('ns')
+
+    # object columns of Python dates or datetimes
+    if values.dtype == object and len(values) and hasattr(values.iloc[0], 'toordinal'):
+        try:
+            return pd.to_datetime(values).dt.as_unit('ns')
+        except (ValueError, TypeError):
+            return values
+
+    return values
+
+
+def profile_frame(df, top_k=TOP_K, precision=HLL_PRECISION):
+    '''
+
+    Function to profile a chunk of data in one pass per column: data types, null
+    counts, min/max, distinct-count sketches and heavy hitters. Profiles of
+    different chunks, shards or weekly batches can be combined with
+    `merge_profiles`. Date-like values are profiled as `datetime64[ns]` (so
+    chunks storing dates as Python dates or datetimes merge consistently), and
+    heavy-hitter counts are exact within the chunk.
+
+
+    Input
+    -----
+    df : Pandas DataFrame
+            Chunk of data (a named index, such as `date`, is profiled as a column).
+
+
+    Optional input
+    --------------
+    top_k : int
+            Number of heavy-hitter counters kept per column (default=`TOP_K`).
+
+    precision : int
+            HyperLogLog precision (default=`HLL_PRECISION`).
+
+
+    Output
+    ------
+    profile : dict
+            Number of rows, and for each column its data type, null count, min,
+            max, HyperLogLog registers and heavy hitters.
+
+    '''
+
+    # profile a named index as a column
+    if df.index.name is not None:
+        df = df.reset_index()
+
+    # instantiate profile
+    profile = {'rows': len(df), 'columns': {}}
+
+    # loop through columns
+    for col in df.columns:
+
+        # current column
+        series = df[col]
+
+        # non-null values (dates in one representation)
+        non_null = _normalize_dates(series.dropna())
+
+        # min/max if meaningful
+        has_order = _has_order(series) and len(non_null)
+
+        profile['columns'][col] = {
+            'dtype': str(series.dtype),
+            'nulls': int(len(series) - len(non_null)),
+            'min': _normalize_bound(non_null.min()) if has_order else None,
+            'max': _normalize_bound(non_null.max()) if has_order else None,
+            'hll': hll_registers(non_null, precision=precision),
+            'top': non_null.value_counts().head(top_k).astype(np.int64)
+        }
+
+    return profile
+
+
+def merge_profiles(a, b, top_k=TOP_K):
+    '''
+
+    Function to merge two profiles (see `profile_frame`).
+
+
+    Input
+    -----
+    a : dict
+            Profile.
+
+    b : dict
+            Profile.
+
+
+    Optional input
+    --------------
+    top_k : int
+            Number of heavy-hitter counters kept per column (default=`TOP_K`).
+
+
+    Output
+    ------
+    merged : dict
+            Combined profile.
+
+    '''
+
+    # instantiate merged profile
+    merged = {'rows': a['rows'] + b['rows'], 'columns': {}}
+
+    # loop through all columns
+    for col in list(a['columns']) + [col for col in b['columns'] if col not in a['columns']]:
+
+        # column profiles (columns missing from one profile are all null there)
+        col_a = a['columns'].get(col)
+        col_b = b['columns'].get(col)
+        if col_a is None or col_b is None:
+            present = col_a or col_b
+            missing_rows = (b if col_a is None else a)['rows']
+            merged['columns'][col] = {**present, 'nulls': present['nulls'] + missing_rows}
+            continue
+
+        # min/max of those available (dates as Timestamps, for profiles saved earlier)
+        mins = [_normalize_bound(value) for value in (col_a['min'], col_b['min'])
+                if value is not None]
+        maxes = [_normalize_bound(value) for value in (col_a['max'], col_b['max'])
+                 if value is not None]
+
+        merged['columns'][col] = {
+            'dtype': col_a['dtype'] if col_a['dtype'] == col_b['dtype']
+            else f"{col_a['dtype']}|{col_b['dtype']}",
+            'nulls': col_a['nulls'] + col_b['nulls'],
+            'min': min(mins) if mins else None,
+            'max': max(maxes) if maxes else None,
+            'hll': np.maximum(col_a['hll'], col_b['hll']),
+            'top': merge_heavy_hitters(col_a['top'], col_b['top'], top_k=top_k)
+        }
+
+    return merged
+
+
+def _profile_shard(file_path, compression, top_k, precision):
+    '''
+
+    Function to load one shard and profile it (run in a worker process).
+
+    '''
+
+    # load shard
+    df = pd.read_pickle(file_path, compression=compression)
+
+    return profile_frame(df, top_k=top_k, precision=precision)
+
+
+def profile_shards(
+        data_path,
+        file_prefix,
+        ext,
+        num_files,
+        compression='infer',
+        top_k=TOP_K,
+        precision=HLL_PRECISION,
+        n_jobs=None,
+        verbose=0):
+    '''
+
+    Function to profile multiple Pickle files (shards) in parallel, one shard per
+    worker process, and merge the results.
+
+    NOTE: Files must have the same naming structure as for `load_multi_df`.
+
+
+    Input
+    -----
+    data_path : str
+            Pathway that contains the files to load.
+            NOTE: Must end in '/'.
+
+    file_prefix : str
+            Consistent prefix of each file.
+
+    ext : str
+            Extension of the files (without a leading dot).
+
+    num_files : int
+            Number of files to load.
+
+
+    Optional input
+    --------------
+    compression : str
+            String denoting type of compression, if any (default='infer').
+
+    top_k : int
+            Number of heavy-hitter counters kept per column (default=`TOP_K`).
+
+    precision : int
+            HyperLogLog precision (default=`HLL_PRECISION`).
+
+    n_jobs : int
+            Number of worker processes (default=None, i.e. number of CPUs).
+            If 1, shards are processed one at a time in the current process.
+
+    verbose : int
+            Setting of status updates (including timestamps). Valid options are 0 or 1.
+
+
+    Output
+    ------
+    profile : dict
+            Combined profile of all shards (see `profile_frame`).
+
+    '''
+
+    # file paths of each shard
+    file_paths = [f'{data_path}{file_prefix}{i}.{ext}' for i in range(1, num_files + 1)]
+
+    # arguments shared by every shard
+    args = (compression, top_k, precision)
+
+    if verbose:
+        # print status/time
+        status_update('Begin profiling...')
+
+    # process in the current process
+    if n_jobs == 1:
+        profiles = [_profile_shard(file_path, *args) for file_path in file_paths]
+
+    # process in parallel
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count()) as executor:
+            futures = [executor.submit(_profile_shard, file_path, *args)
+                       for file_path in file_paths]
+            profiles = [future.result() for future in futures]
+
+    # combine shard profiles
+    profile = profiles[0]
+    for other in profiles[1:]:
+        profile = merge_profiles(profile, other, top_k=top_k)
+
+    if verbose:
+        # print status/time
+        status_update('Profiling complete!')
+
+    return profile
+
+
+def profile_report(profile, n_top=5):
+    '''
+
+    Function to summarize a profile as a table with one row per column.
+
+
+    Input
+    -----
+    profile : dict
+            Profile (see `profile_frame`).
+
+
+    Optional input
+    --------------
+    n_top : int
+            Number of most common values to list per column (default=5).
+
+
+    Output
+    ------
+    report : Pandas DataFrame
+            Data type, null count and percentage, min, max, estimated number of
+            distinct values, and most common values (with approximate counts).
+
+    '''
+
+    # instantiate empty list
+    rows = []
+
+    # loop through columns
+    for col, stats in profile['columns'].items():
+        rows.append({
+            'column': col,
+            'dtype': stats['dtype'],
+            'nulls': stats['nulls'],
+            'null_pct': 100 * stats['nulls'] / profile['rows'] if profile['rows'] else 0,
+            'min': stats['min'],
+            'max': stats['max'],
+            'distinct_est': hll_estimate(stats['hll']),
+            'top_values': list(stats['top'].head(n_top).items())
+        })
+
+    report = pd.DataFrame(rows).set_index('column')
+
+    return report
@@ -0,0 +1,426 @@
+# standard dataframe packages
+import pandas as pd
+import numpy as np
+
+# parallel processing packages
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from functions.data_cleaning import status_update
+from functions.profiling import hll_ranks
+
+
+# aggregations that can be computed per shard and combined afterwards,
+# mapped to the aggregation that combines the partial results
+COMBINERS = {
+    'size': 'sum',
+    'count': 'sum',
+    'sum': 'sum',
+    'min': 'min',
+    'max': 'max'
+}
+
+# HyperLogLog precision of 'nunique' sketches (2^10 registers per group, ~3% error)
+NUNIQUE_PRECISION = 10
+
+
+def _prepare_keys(df, by, date_col, date_freq):
+    '''
+
+    Function to make sure the groupby keys are columns and to convert the date
+    column to periods (e.g. years or months) if requested.
+
+
+    Input
+    -----
+    df : Pandas DataFrame
+            One shard of data.
+
+    by : list (str)
+            Names of the columns to group by.
+
+    date_col : str
+            Name of the date column.
+
+    date_freq : str
+            Period frequency for the date column (e.g. 'Y' or 'M'), or None.
+
+
+    Output
+    ------
+    df : Pandas DataFrame
+            Shard with groupby keys as columns (a new DataFrame if anything was
+            converted).
+
+    '''
+
+    # date may be saved as the index
+    if date_col not in df.columns and df.index.name == date_col:
+        df = df.reset_index()
+
+    # convert dates to periods (on a copy, so the caller's data is unchanged)
+    if date_freq and date_col in by:
+        df = df.assign(
+            **{date_col: pd.PeriodIndex(pd.to_datetime(df[date_col]), freq=date_freq)}
+        )
+
+    return df
+
+
+def partial_aggregate(
+        df,
+        by,
+        agg=None,
+        date_col='date',
+        date_freq=None,
+        precision=NUNIQUE_PRECISION):
+    '''
+
+    Function to compute partial aggregates for one shard of data, to be combined
+    with those of the other shards via `combine_partials`.
+
+
+    Input
+    -----
+    df : Pandas DataFrame
+            One shard of data.
+
+    by : list (str)
+            Names of the columns to group by.
+
+
+    Optional input
+    --------------
+    agg : dict
+            Column names mapped to a list of aggregations. Valid aggregations are
+            'count', 'sum', 'min', 'max', 'nunique' (approximate, via HyperLogLog
+            sketches) and 'nunique_exact' (default=None, i.e. only the number of
+            rows per group).
+            NOTE: 'nunique_exact' keeps every distinct (keys, value) pair, so its
+            memory grows with the data (e.g. for titles or subjects).
+
+    date_col : str
+            Name of the date column (default='date').
+
+    date_freq : str
+            Period frequency to convert the date column to before grouping,
+            e.g. 'Y' for checkouts per year (default=None, i.e. daily).
+
+    precision : int
+            HyperLogLog precision of 'nunique' sketches (default=`NUNIQUE_PRECISION`).
+
+
+    Output
+    ------
+    simple : Pandas DataFrame
+            Combinable aggregates (size, count, sum, min, max) per group.
+
+    sketches : dict
+            Column names mapped to Series of the maximum HyperLogLog rank per
+            (keys, register), used to estimate unique values per group across
+            shards. At most 2^precision entries per group.
+
+    distinct : dict
+            Column names mapped to DataFrames of distinct (keys, value) pairs, used
+            to count unique values per group exactly across shards.
+
+    '''
+
+    # default to number of rows only
+    agg = agg or {}
+
+    # groupby keys as columns
+    df = _prepare_keys(df, by, date_col, date_freq)
+
+    # group shard
+    grouped = df.groupby(by, observed=True, dropna=False, sort=False)
+
+    # number of rows per group
+    parts = [grouped.size().rename(('size', 'size'))]
+
+    # instantiate empty dictionaries
+    sketches = {}
+    distinct = {}
+
+    # loop through columns and their aggregations
+    for col, ops in agg.items():
+
+        # allow a single aggregation as a string
+        if isinstance(ops, str):
+            ops = [ops]
+
+        # combinable aggregations
+        simple_ops = [op for op in ops if op in COMBINERS]
+        if simple_ops:
+            part = grouped[col].agg(simple_ops)
+            part.columns = [(col, op) for op in simple_ops]
+            parts.append(part)
+
+        # unique values are sketched as the maximum rank per (keys, register)
+        if 'nunique' in ops:
+            keep = df[col].notna().to_numpy()
+            idx, rank = hll_ranks(df.loc[keep, col], precision=precision)
+            sketch = df.loc[keep, by].assign(register=idx, rank=rank)
+            sketches[col] = sketch.groupby(
+                by + ['register'], observed=True, dropna=False, sort=False
+            )['rank'].max()
+
+        # exact unique values are kept as distinct (keys, value) pairs
+        if 'nunique_exact' in ops:
+            distinct[col] = df[by + [col]].drop_duplicates()
+
+    # combine into one DataFrame
+    simple = pd.concat(parts, axis=1)
+
+    return simple, sketches, distinct
+
+
+def _estimate_nunique(sketch, by, precision):
+    '''
+
+    Function to estimate the number of unique values per group from sparse
+    HyperLogLog registers (registers that are absent are zero).
+
+    '''
+
+    # number of registers
+    m = 2 ** precision
+
+    # registers per group and harmonic sum of their values
+    grouped = (2.0 ** -sketch.astype(np.float64)).groupby(level=by, dropna=False)
+    present = grouped.size()
+    zeros = m - present
+    harmonic = grouped.sum() + zeros
+
+    # raw estimate
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m ** 2 / harmonic
+
+    # small range correction (linear counting)
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / zeros)
+    estimate = estimate.where((estimate > 2.5 * m) | (zeros == 0), linear)
+
+    return estimate.round().astype(np.int64)
+
+
+def combine_partials(partials, by, precision=NUNIQUE_PRECISION):
+    '''
+
+    Function to combine partial aggregates from multiple shards.
+
+
+    Input
+    -----
+    partials : list (tuple)
+            List of (simple, sketches, distinct) triples (see `partial_aggregate`).
+
+    by : list (str)
+            Names of the columns grouped by.
+
+
+    Optional input
+    --------------
+    precision : int
+            HyperLogLog precision of the 'nunique' sketches (default=`NUNIQUE_PRECISION`).
+
+
+    Output
+    ------
+    result : Pandas DataFrame
+            Final aggregates per group, with columns named '{column}_{aggregation}'
+            and 'size' for the number of rows.
+
+    '''
+
+    # stack combinable aggregates
+    simple = pd.concat([partial[0] for partial in partials])
+
+    # combine each column with its matching aggregation
+    result = simple.groupby(level=by, dropna=False).agg(
+        {col: COMBINERS[col[1]] for col in simple.columns}
+    )
+
+    # flatten column names
+    result.columns = [
+        'size' if op == 'size' else f'{col}_{op}' for col, op in result.columns
+    ]
+
+    # columns with approximate unique counts
+    sketch_cols = {col for partial in partials for col in partial[1]}
+
+    # loop through columns
+    for col in sketch_cols:
+
+        # maximum rank per (keys, register) across all shards
+        sketch = pd.concat(
+            [partial[1][col] for partial in partials if col in partial[1]]
+        ).groupby(level=by + ['register'], dropna=False).max()
+
+        # estimate unique values per group (groups with only nulls have none)
+        result[f'{col}_nunique'] = _estimate_nunique(sketch, by, precision)
+        result[f'{col}_nunique'] = result[f'{col}_nunique'].fillna(0).astype(np.int64)
+
+    # columns with exact unique counts
+    distinct_cols = {col for partial in partials for col in partial[2]}
+
+    # loop through columns
+    for col in distinct_cols:
+
+        # distinct pairs across all shards
+        pairs = pd.concat(
+            [partial[2][col] for partial in partials if col in partial[2]]
+        ).drop_duplicates()
+
+        # count non-null unique values per group
+        result[f'{col}_nunique_exact'] = pairs.groupby(
+            by, observed=True, dropna=False
+        )[col].count()
+
+    return result
+
+
+def _shard_worker(file_path, compression, by, agg, date_col, date_freq, precision):
+    '''
+
+    Function to load one shard and compute its partial aggregates (run in a
+    worker process).
+
+    '''
+
+    # load shard
+    df = pd.read_pickle(file_path, compression=compression)
+
+    return partial_aggregate(
+        df, by, agg=agg, date_col=date_col, date_freq=date_freq, precision=precision
+    )
+
+
+def shard_groupby(
+        data_path,
+        file_prefix,
+        ext,
+        num_files,
+        by,
+        agg=None,
+        date_col='date',
+        date_freq=None,
+        precision=NUNIQUE_PRECISION,
+        compression='infer',
+        n_jobs=None,
+        verbose=0):
+    '''
+
+    Function to run a groupby aggregation over multiple Pickle files (shards) in
+    parallel, without concatenating them into one DataFrame. Each worker process
+    loads one shard at a time and returns partial aggregates, so peak memory is
+    roughly one shard per worker. Unique counts ('nunique') are estimated from
+    HyperLogLog sketches of at most 2^precision registers per group, so partial
+    results stay small however many distinct values there are.
+
+    NOTE: Files must have the same naming structure as for `load_multi_df`.
+
+    For example, checkouts and unique subjects per title per year:
+        shard_groupby('data/', 'seattle_lib_', 'pkl', 11, ['title', 'date'],
+                      agg={'subjects': ['nunique']}, date_freq='Y')
+
+
+    Input
+    -----
+    data_path : str
+            Pathway that contains the files to load.
+            NOTE: Must end in '/'.
+
+    file_prefix : str
+            Consistent prefix of each file.
+
+    ext : str
+            Extension of the files (without a leading dot).
+
+    num_files : int
+            Number of files to load.
+
+    by : list (str)
+            Names of the columns to group by.
+
+
+    Optional input
+    --------------
+    agg : dict
+            Column names mapped to a list of aggregations. Valid aggregations are
+            'count', 'sum', 'min', 'max', 'nunique' (approximate, via HyperLogLog
+            sketches) and 'nunique_exact' (default=None, i.e. only the number of
+            rows per group).
+            NOTE: 'nunique_exact' keeps every distinct (keys, value) pair, so its
+            memory grows with the data (e.g. for titles or subjects).
+
+    date_col : str
+            Name of the date column (default='date').
+
+    date_freq : str
+            Period frequency to convert the date column to before grouping,
+            e.g. 'Y' or 'M' (default=None, i.e. daily).
+
+    precision : int
+            HyperLogLog precision of 'nunique' sketches (default=`NUNIQUE_PRECISION`).
+            Higher values are more accurate but use more memory per group.
+
+    compression : str
+            String denoting type of compression, if any (default='infer').
+
+    n_jobs : int
+            Number of worker processes (default=None, i.e. number of CPUs).
+            If 1, shards are processed one at a time in the current process.
+
+    verbose : int
+            Setting of status updates (including timestamps). Valid options are 0 or 1.
+
+
+    Output
+    ------
+    result : Pandas DataFrame
+            Final aggregates per group (see `combine_partials`).
+
+    '''
+
+    # allow a single groupby key as a string
+    if isinstance(by, str):
+        by = [by]
+
+    # file paths of each shard
+    file_paths = [f'{data_path}{file_prefix}{i}.{ext}' for i in range(1, num_files + 1)]
+
+    # arguments shared by every shard
+    args = (compression, by, agg, date_col, date_freq, precision)
+
+    if verbose:
+        # print status/time
+        status_update('Begin aggregation...')
+
+    # process in the current process
+    if n_jobs == 1:
+        partials = [_shard_worker(file_path, *args) for file_path in file_paths]
+
+    # process in parallel
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count()) as executor:
+
+            # submit each shard
+            futures = [executor.submit(_shard_worker, file_path, *args)
+                       for file_path in file_paths]
+
+            # collect partial aggregates
+            partials = [future.result() for future in futures]
+
+    if verbose:
+        # print status/time
+        status_update('Partial aggregates computed. Combining...')
+
+    # combine partial aggregates
+    result = combine_partials(partials, by, precision=precision)
+
+    if verbose:
+        # print status/time
+        status_update('Aggregation complete!')
+
+    return result
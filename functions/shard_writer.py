@@ -0,0 +1,402 @@
+# standard dataframe packages
+import pandas as pd
+
+# saving packages
+import pickle
+import gzip
+import bz2
+import lzma
+import hashlib
+import json
+
+# parallel processing and os packages
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import os
+
+from functions.data_cleaning import status_update
+
+
+# supported codecs (all readable by `pd.read_pickle` with `compression=codec`)
+CODECS = ['gzip', 'bz2', 'xz', 'zstd', None]
+
+# default compression level of each codec
+DEFAULT_LEVELS = {
+    'gzip': 6,
+    'bz2': 9,
+    'xz': 6,
+    'zstd': 3,
+    None: None
+}
+
+# default maximum number of files compressed at once (each holds a serialized
+# and a compressed copy of its rows in memory)
+DEFAULT_JOBS = 4
+
+
+def compress_bytes(data, codec='gzip', level=None):
+    '''
+
+    Function to compress bytes with a codec that `pd.read_pickle` can read.
+
+
+    Input
+    -----
+    data : bytes
+            Data to compress.
+
+
+    Optional input
+    --------------
+    codec : str
+            One of `CODECS` (default='gzip'). None for no compression.
+            NOTE: 'zstd' requires the `zstandard` package.
+
+    level : int
+            Compression level (default=None, i.e. `DEFAULT_LEVELS[codec]`).
+
+
+    Output
+    ------
+    compressed : bytes
+            Compressed data.
+
+    '''
+
+    # check codec
+    if codec not in CODECS:
+        raise ValueError(f'Unknown codec: {codec}. Valid codecs are {CODECS}.')
+
+    # default level
+    if level is None:
+        level = DEFAULT_LEVELS[codec]
+
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=level)
+
+    if codec == 'bz2':
+        return bz2.compress(data, compresslevel=level)
+
+    if codec == 'xz':
+        return lzma.compress(data, preset=level)
+
+    if codec == 'zstd':
+        # optional package
+        import zstandard
+        return zstandard.ZstdCompressor(level=level, write_content_size=True).compress(data)
+
+    return data
+
+
+def shard_bounds(n_rows, rows_per_file):
+    '''
+
+    Function to split a number of rows into consecutive (start, end) positions.
+
+
+    Input
+    -----
+    n_rows : int
+            Total number of rows.
+
+    rows_per_file : int
+            Maximum number of rows per file.
+
+
+    Output
+    ------
+    bounds : list (tuple)
+            (start, end) positions of each file, with `end` not inclusive.
+
+    '''
+
+    # at least one (possibly empty) file
+    starts = range(0, max(n_rows, 1), rows_per_file)
+
+    return [(start, min(start + rows_per_file, n_rows)) for start in starts]
+
+
+def rows_for_target_size(df, target_mb, sample_rows=100000):
+    '''
+
+    Function to estimate how many rows make up a target (in-memory) size, based
+    on the deep memory usage of a sample of rows.
+
+
+    Input
+    -----
+    df : Pandas DataFrame
+            Data to be split.
+
+    target_mb : float
+            Target size of each file in megabytes, before compression.
+
+
+    Optional input
+    --------------
+    sample_rows : int
+            Number of rows to measure (default=100000).
+
+
+    Output
+    ------
+    rows_per_file : int
+            Number of rows per file.
+
+    '''
+
+    # measure a sample only (deep usage of object strings is slow)
+    sample = df.iloc[:sample_rows]
+    bytes_per_row = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+
+    return max(1, int(target_mb * 1e6 / max(bytes_per_row, 1)))
+
+
+def _write_shard(data, file_path, codec, level):
+    '''
+
+    Function to compress serialized data and write it atomically via a temporary
+    file (run in a worker thread; compression releases the GIL).
+
+    '''
+
+    # compress
+    compressed = compress_bytes(data, codec=codec, level=level)
+
+    # write to a temporary file, then rename so partial files are never read
+    with open(file_path + '.tmp', 'wb') as f:
+        f.write(compressed)
+    os.replace(file_path + '.tmp', file_path)
+
+    return {
+        'bytes': len(compressed),
+        'sha256': hashlib.sha256(compressed).hexdigest()
+    }
+
+
+def manifest_path(data_path, file_prefix):
+    '''
+
+    Function to build the path of the manifest for a set of saved files.
+
+    '''
+
+    return f'{data_path}{file_prefix}manifest.json'
+
+
+def save_shards(
+        df,
+        data_path,
+        file_prefix='seattle_lib_',
+        ext='pkl',
+        rows_per_file=None,
+        target_mb=None,
+        codec='gzip',
+        level=None,
+        n_jobs=None,
+        verbose=0):
+    '''
+
+    Function to save a DataFrame as multiple compressed Pickle files, compressing
+    several files at once, and record a manifest with row counts and checksums.
+    Files are numbered from 1 and readable with `load_multi_df` (using
+    `compression=codec`). Files left over from an earlier save with more files
+    are deleted, so only the files in the manifest remain.
+
+    NOTE: Besides `df` itself, peak memory is roughly `n_jobs` files' worth of
+    serialized rows plus their compressed copies (e.g. about 4 x 2 x 1.5 GB with
+    the defaults, for 10 million checkout rows per file).
+
+
+    Input
+    -----
+    df : Pandas DataFrame
+            Data to save.
+
+    data_path : str
+            Pathway in which to save the files.
+            NOTE: Must end in '/'.
+
+
+    Optional input
+    --------------
+    file_prefix : str
+            Consistent prefix of each file (default='seattle_lib_').
+
+    ext : str
+            Extension of the files (without a leading dot; default='pkl').
+
+    rows_per_file : int
+            Maximum number of rows in each file (default=None, i.e. based on
+            `target_mb`, or 10 million if neither is given).
+
+    target_mb : float
+            Target size of each file in megabytes before compression
+            (default=None).
+
+    codec : str
+            One of `CODECS` (default='gzip'). 'zstd' is several times faster
+            than 'gzip' at similar ratios, but requires the `zstandard` package.
+
+    level : int
+            Compression level (default=None, i.e. `DEFAULT_LEVELS[codec]`).
+
+    n_jobs : int
+            Number of files compressed at once (default=None, i.e. `DEFAULT_JOBS`
+            or the number of CPUs, whichever is smaller).
+
+    verbose : int
+            Setting of status updates (including timestamps). Valid options are 0 or 1.
+
+
+    Output
+    ------
+    manifest : dict
+            Codec, level, total rows, columns and, for each file, its name, number
+            of rows, size in bytes and SHA-256 checksum (also saved as JSON).
+
+    '''
+
+    # check codec before doing any work
+    if codec not in CODECS:
+        raise ValueError(f'Unknown codec: {codec}. Valid codecs are {CODECS}.')
+
+    # rows per file
+    if rows_per_file is None:
+        rows_per_file = rows_for_target_size(df, target_mb) if target_mb else 10000000
+
+    # (start, end) of each file
+    bounds = shard_bounds(len(df), rows_per_file)
+
+    # number of files compressed at once (bounds the serialized files in memory)
+    n_jobs = n_jobs or min(DEFAULT_JOBS, os.cpu_count() or 1)
+
+    # instantiate empty dictionary
+    futures = {}
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+
+        # loop through files
+        for ind, (start, end) in enumerate(bounds, 1):
+
+            # limit the number of serialized files held in memory
+            pending = [future for future in futures if not future.done()]
+            if len(pending) >= n_jobs:
+                wait(pending, return_when=FIRST_COMPLETED)
+
+            # serialize (the same format `to_pickle` writes)
+            data = pickle.dumps(df.iloc[start:end], protocol=pickle.HIGHEST_PROTOCOL)
+
+            # compress and write in a worker thread
+            file_name = f'{file_prefix}{ind}.{ext}'
+            future = executor.submit(_write_shard, data, data_path + file_name, codec, level)
+            futures[future] = {'file': file_name, 'rows': end - start}
+            del data
+
+            if verbose:
+                # print status/time
+                status_update(f'File {ind} out of {len(bounds)} queued for saving')
+
+        # collect file info in order
+        files = []
+        for future, info in futures.items():
+            files.append({**info, **future.result()})
+
+    # delete higher-numbered files left over from an earlier save
+    stale = len(bounds) + 1
+    while os.path.exists(f'{data_path}{file_prefix}{stale}.{ext}'):
+        os.remove(f'{data_path}{file_prefix}{stale}.{ext}')
+        stale += 1
+
+    # manifest of saved files
+    manifest = {
+        'codec': codec,
+        'level': level if level is not None else DEFAULT_LEVELS[codec],
+        'total_rows': len(df),
+        'columns': [str(col) for col in df.columns],
+        'files': files
+    }
+
+    # save manifest atomically
+    file_path = manifest_path(data_path, file_prefix)
+    with open(file_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(file_path + '.tmp', file_path)
+
+    if verbose:
+        # print status/time
+        status_update(f'{len(files)} files saved successfully')
+
+    return manifest
+
+
+def load_manifest(data_path, file_prefix='seattle_lib_'):
+    '''
+
+    Function to load the manifest saved by `save_shards`, or None if there is none.
+
+    '''
+
+    # manifest file
+    file_path = manifest_path(data_path, file_prefix)
+
+    if not os.path.exists(file_path):
+        return None
+
+    with open(file_path) as f:
+        return json.load(f)
+
+
+def verify_shards(data_path, file_prefix='seattle_lib_'):
+    '''
+
+    Function to check saved files against their manifest checksums.
+
+
+    Input
+    -----
+    data_path : str
+            Pathway that contains the files.
+            NOTE: Must end in '/'.
+
+
+    Optional input
+    --------------
+    file_prefix : str
+            Consistent prefix of each file (default='seattle_lib_').
+
+
+    Output
+    ------
+    results : Pandas DataFrame
+            For each file, whether it exists and whether its checksum matches.
+
+    '''
+
+    # saved manifest
+    manifest = load_manifest(data_path, file_prefix)
+    if manifest is None:
+        raise FileNotFoundError(f'No manifest at {manifest_path(data_path, file_prefix)}.')
+
+    # instantiate empty list
+    results = []
+
+    # loop through files
+    for info in manifest['files']:
+
+        # current file
+        file_path = data_path + info['file']
+        exists = os.path.exists(file_path)
+
+        # checksum in chunks to limit memory
+        matches = False
+        if exists:
+            sha = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 24), b''):
+                    sha.update(block)
+            matches = sha.hexdigest() == info['sha256']
+
+        results.append({'file': info['file'], 'rows': info['rows'],
+                        'exists': exists, 'checksum_ok': matches})
+
+    return pd.DataFrame(results)
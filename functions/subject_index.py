@@ -0,0 +1,411 @@
+# standard dataframe packages
+import pandas as pd
+import numpy as np
+
+
+def tokenize_subjects(subjects, sep=','):
+    '''
+
+    Function to split comma-separated subject headings into individual, stripped
+    subjects.
+
+
+    Input
+    -----
+    subjects : Pandas Series or Index
+            Subject heading strings (ideally unique values only).
+
+
+    Optional input
+    --------------
+    sep : str
+            Separator between subjects (default=',').
+
+
+    Output
+    ------
+    tokens : Pandas Series
+            One subject per row, indexed by the position of its heading string in
+            `subjects`.
+
+    '''
+
+    # split into lists, one row per subject
+    tokens = pd.Series(np.asarray(subjects, dtype=object)).str.split(sep).explode()
+
+    # clean up whitespace
+    tokens = tokens.str.strip()
+
+    # drop empty subjects
+    tokens = tokens[tokens.notna() & (tokens != '')]
+
+    return tokens
+
+
+def _empty_subject_index():
+    '''
+
+    Function to instantiate an empty subject index (see `extend_subject_index`).
+
+    '''
+
+    index = {
+        # subject headings; a subject's id is its position
+        'vocab': pd.Index([], dtype=object),
+        # distinct subject heading strings ("documents"); a doc's id is its position
+        'docs': pd.Index([], dtype=object),
+        # total checkouts of each doc
+        'doc_counts': np.array([], dtype=np.int64),
+        # (doc id, subject id) pairs
+        'doc_ids': np.array([], dtype=np.int32),
+        'term_ids': np.array([], dtype=np.int32),
+        # daily checkouts per subject (and category), sorted by subject id
+        'postings': pd.DataFrame({
+            'term_id': np.array([], dtype=np.int32),
+            'date': pd.to_datetime([]),
+            'category': pd.Categorical([]),
+            'count': np.array([], dtype=np.int64)
+        }),
+        # start/end positions of each subject id within `postings`
+        'offsets': np.array([0], dtype=np.int64)
+    }
+
+    return index
+
+
+def extend_subject_index(
+        index,
+        df,
+        subjects_col='subjects',
+        date_col='date',
+        category_col='category_group'):
+    '''
+
+    Function to add checkouts to a subject index (or build a new one). Checkouts
+    are first collapsed to counts per (subject headings, date, category), so each
+    distinct heading string is only tokenized once. New subjects are appended to
+    the vocabulary, so existing subject ids never change.
+
+    Use on one shard or one weekly API pull at a time to build or update the index
+    without loading all checkouts at once.
+
+
+    Input
+    -----
+    index : dict
+            Existing subject index, or None to build a new one.
+
+    df : Pandas DataFrame
+            Checkout data with subject heading, date and (optionally) category columns.
+
+
+    Optional input
+    --------------
+    subjects_col : str
+            Name of the column with comma-separated subject headings
+            (default='subjects').
+
+    date_col : str
+            Name of the date column, or index (default='date').
+
+    category_col : str
+            Name of the category column, or None to skip (default='category_group').
+
+
+    Output
+    ------
+    index : dict
+            Updated subject index.
+
+    '''
+
+    # start from an empty index
+    if index is None:
+        index = _empty_subject_index()
+
+    # date may be saved as the index
+    if date_col not in df.columns and df.index.name == date_col:
+        df = df.reset_index()
+
+    # columns to group by
+    keys = [subjects_col, date_col] + ([category_col] if category_col else [])
+
+    # collapse to checkouts per (headings, date, category)
+    counts = df.groupby(keys, observed=True).size().reset_index(name='count')
+
+    # placeholder category if none given
+    if not category_col:
+        counts['category'] = 'All'
+        category_col = 'category'
+
+    # distinct heading strings not yet in the index
+    new_docs = pd.Index(counts[subjects_col].unique()).difference(index['docs'])
+
+    # tokenize new docs only
+    tokens = tokenize_subjects(new_docs)
+
+    # subjects not yet in the vocabulary
+    new_terms = pd.Index(tokens.unique()).difference(index['vocab'])
+
+    # extend vocabulary and docs (existing ids are unchanged)
+    vocab = index['vocab'].append(new_terms)
+    docs = index['docs'].append(new_docs)
+
+    # (doc id, subject id) pairs of the new docs
+    new_doc_ids = (len(index['docs']) + tokens.index.values).astype(np.int32)
+    new_term_ids = vocab.get_indexer(tokens.values).astype(np.int32)
+
+    # a subject may be repeated within a heading string; keep unique pairs
+    pairs = np.unique(np.stack([new_doc_ids, new_term_ids]), axis=1)
+    doc_ids = np.concatenate([index['doc_ids'], pairs[0]])
+    term_ids = np.concatenate([index['term_ids'], pairs[1]])
+
+    # doc id of each count
+    counts['doc_id'] = docs.get_indexer(counts[subjects_col])
+
+    # total checkouts per doc
+    doc_counts = np.bincount(
+        counts['doc_id'], weights=counts['count'], minlength=len(docs)
+    ).astype(np.int64)
+    doc_counts[:len(index['doc_counts'])] += index['doc_counts']
+
+    # one row per (doc, subject) for each count
+    doc_terms = pd.DataFrame({'doc_id': doc_ids, 'term_id': term_ids})
+    new_postings = counts.merge(doc_terms, on='doc_id')[
+        ['term_id', date_col, category_col, 'count']
+    ]
+    new_postings.columns = ['term_id', 'date', 'category', 'count']
+    new_postings['date'] = pd.to_datetime(new_postings['date'])
+
+    # combine with existing postings and sum matching rows
+    postings = pd.concat(
+        [index['postings'], new_postings], ignore_index=True
+    )
+    postings['category'] = postings['category'].astype('category')
+    postings = postings.groupby(
+        ['term_id', 'date', 'category'], observed=True
+    )['count'].sum().reset_index()
+
+    # positions of each subject id within postings (already sorted by groupby)
+    offsets = np.searchsorted(
+        postings['term_id'].values, np.arange(len(vocab) + 1)
+    ).astype(np.int64)
+
+    index = {
+        'vocab': vocab,
+        'docs': docs,
+        'doc_counts': doc_counts,
+        'doc_ids': doc_ids,
+        'term_ids': term_ids,
+        'postings': postings,
+        'offsets': offsets
+    }
+
+    return index
+
+
+def build_subject_index(
+        df,
+        subjects_col='subjects',
+        date_col='date',
+        category_col='category_group'):
+    '''
+
+    Function to build a subject index from checkout data
+    (see `extend_subject_index`).
+
+    '''
+
+    return extend_subject_index(
+        None, df,
+        subjects_col=subjects_col, date_col=date_col, category_col=category_col
+    )
+
+
+def subject_series(index, subject, category=None):
+    '''
+
+    Function to retrieve the daily number of checkouts for one subject.
+
+
+    Input
+    -----
+    index : dict
+            Subject index.
+
+    subject : str
+            Subject heading (exact match, e.g. 'Dragons Juvenile fiction').
+
+
+    Optional input
+    --------------
+    category : str
+            Only count checkouts within this category (default=None, i.e. all).
+
+
+    Output
+    ------
+    series : Pandas Series
+            Number of checkouts per date (only dates with checkouts).
+
+    '''
+
+    # subject id
+    term_id = index['vocab'].get_loc(subject)
+
+    # slice of postings for this subject
+    postings = index['postings'].iloc[
+        index['offsets'][term_id]:index['offsets'][term_id + 1]
+    ]
+
+    # subset to category
+    if category is not None:
+        postings = postings[postings['category'] == category]
+
+    # sum across categories
+    series = postings.groupby('date')['count'].sum().rename(subject)
+
+    return series
+
+
+def top_subjects(index, n=25, category=None, start=None, end=None):
+    '''
+
+    Function to retrieve the subjects with the most checkouts.
+
+
+    Input
+    -----
+    index : dict
+            Subject index.
+
+
+    Optional input
+    --------------
+    n : int
+            Number of subjects to return (default=25).
+
+    category : str
+            Only count checkouts within this category (default=None, i.e. all).
+
+    start : str or timestamp
+            First date to count (default=None).
+
+    end : str or timestamp
+            Last date to count, inclusive (default=None).
+
+
+    Output
+    ------
+    top : Pandas Series
+            Number of checkouts for the top `n` subjects.
+
+    '''
+
+    # all postings
+    postings = index['postings']
+
+    # boolean mask of rows to count
+    mask = np.ones(len(postings), dtype=bool)
+    if category is not None:
+        mask &= (postings['category'] == category).values
+    if start is not None:
+        mask &= (postings['date'] >= start).values
+    if end is not None:
+        mask &= (postings['date'] <= end).values
+
+    # total checkouts per subject id
+    totals = np.bincount(
+        postings['term_id'].values[mask],
+        weights=postings['count'].values[mask],
+        minlength=len(index['vocab'])
+    )
+
+    # ids of the top subjects
+    top_ids = np.argsort(totals)[::-1][:n]
+
+    top = pd.Series(totals[top_ids].astype(np.int64), index=index['vocab'][top_ids])
+
+    # drop subjects without checkouts
+    top = top[top > 0]
+
+    return top
+
+
+def co_occurring_subjects(index, subject, n=25):
+    '''
+
+    Function to retrieve the subjects most often checked out together with a
+    subject (i.e. within the same item's subject headings).
+
+
+    Input
+    -----
+    index : dict
+            Subject index.
+
+    subject : str
+            Subject heading (exact match).
+
+
+    Optional input
+    --------------
+    n : int
+            Number of subjects to return (default=25).
+
+
+    Output
+    ------
+    co_counts : Pandas Series
+            Number of checkouts shared with `subject`, for the top `n` subjects.
+
+    '''
+
+    # subject id
+    term_id = index['vocab'].get_loc(subject)
+
+    # docs that contain the subject
+    docs = index['doc_ids'][index['term_ids'] == term_id]
+
+    # (doc, subject) pairs from those docs
+    mask = np.isin(index['doc_ids'], docs)
+
+    # checkouts per co-occurring subject
+    totals = np.bincount(
+        index['term_ids'][mask],
+        weights=index['doc_counts'][index['doc_ids'][mask]],
+        minlength=len(index['vocab'])
+    )
+
+    # exclude the subject itself
+    totals[term_id] = 0
+
+    # ids of the top subjects
+    top_ids = np.argsort(totals)[::-1][:n]
+
+    co_counts = pd.Series(totals[top_ids].astype(np.int64), index=index['vocab'][top_ids])
+
+    # drop subjects that never co-occur
+    co_counts = co_counts[co_counts > 0]
+
+    return co_counts
+
+
+def save_subject_index(index, file_path):
+    '''
+
+    Function to save a subject index as a compressed pickle.
+
+    '''
+
+    pd.to_pickle(index, file_path, compression='gzip')
+
+
+def load_subject_index(file_path):
+    '''
+
+    Function to load a subject index saved with `save_subject_index`.
+
+    '''
+
+    return pd.read_pickle(file_path, compression='gzip')
@@ -0,0 +1,253 @@
+# standard dataframe packages
+import pandas as pd
+import numpy as np
+
+# os packages
+import os
+
+
+# version of the normalization, stored with cached key maps; increase it when
+# `canonical_title_keys` or `TITLE_PATTERNS` change so cached keys are recomputed
+TITLE_KEY_VERSION = 2
+
+# patterns removed from titles before comparing them, in order
+TITLE_PATTERNS = [
+    # statement of responsibility, e.g. ' / Donna Tartt.'
+    r'\s/.*$',
+    # general material designations, e.g. '[videorecording]'
+    r'\[[^\]]*\]',
+    # edition statements, e.g. '2nd ed.', 'special edition', 'widescreen version'
+    r'\b\d+(st|nd|rd|th)\s+ed(ition)?\b\.?',
+    r"\b(special|collector'?s|anniversary|deluxe|widescreen|full[- ]screen|"
+    r"unabridged|abridged|large print|revised|updated)\s+(ed(ition)?|version)\b\.?",
+    # the same descriptors alone, only in parentheses or at the end of the title
+    r"\(\s*(special|collector'?s|anniversary|deluxe|widescreen|full[- ]screen|"
+    r"unabridged|abridged|large print|revised|updated)\s*\)",
+    r"[,;:]?\s+(widescreen|full[- ]screen|unabridged|abridged|large print)\s*\.?$",
+    # subtitle tags that vary between editions, e.g. ': a novel'
+    r':\s*a\s+novel\b',
+    # leading articles
+    r'^(the|a|an)\s+'
+]
+
+
+def canonical_title_keys(titles):
+    '''
+
+    Function to compute a normalized key for each title, so that variants of the
+    same work (case, punctuation, accents, author suffixes, edition statements)
+    share one key. Intended for unique titles only (see `title_key_map`).
+
+
+    Input
+    -----
+    titles : Pandas Series or Index
+            Title strings.
+
+
+    Output
+    ------
+    keys : Pandas Series
+            Normalized keys, with the same index as a Series of `titles`.
+
+    '''
+
+    # lowercase
+    raw = pd.Series(titles, dtype=object).str.lower()
+
+    # strip accents from Latin letters only (e.g. 'é' but not Cyrillic 'й'), then
+    # recompose, so non-Latin titles keep their own keys
+    keys = raw.str.normalize('NFKD').str.replace(r'(?<=[a-z])[\u0300-\u036f]+', '', regex=True)
+    keys = keys.str.normalize('NFC')
+
+    # collapse whitespace so patterns match consistently
+    keys = keys.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+    # remove author suffixes, designations, edition statements, etc.
+    for pattern in TITLE_PATTERNS:
+        keys = keys.str.replace(pattern, ' ', regex=True).str.strip()
+
+    # '&' and 'and' are equivalent
+    keys = keys.str.replace(r'\s*&\s*', ' and ', regex=True)
+
+    # drop remaining punctuation and collapse whitespace
+    keys = keys.str.replace(r'[^\w\s]', '', regex=True)
+    keys = keys.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+    # titles with nothing left (e.g. only punctuation) keep their lowercased title
+    empty = keys.eq('')
+    keys[empty] = raw[empty].str.strip()
+
+    return keys
+
+
+def title_key_map(titles, cache_path=None):
+    '''
+
+    Function to map each distinct title to its normalized key, only computing keys
+    for titles not already in the cached mapping (the whole mapping is recomputed
+    when `TITLE_KEY_VERSION` changes).
+
+
+    Input
+    -----
+    titles : Pandas Series, Index or array
+            Title strings (duplicates are dropped before computing keys).
+
+
+    Optional input
+    --------------
+    cache_path : str
+            File path of the cached mapping, saved as a compressed pickle
+            (default=None, i.e. no caching).
+
+
+    Output
+    ------
+    key_map : Pandas Series
+            Normalized keys indexed by title.
+
+    '''
+
+    # distinct titles only
+    uniques = pd.Index(pd.unique(np.asarray(titles, dtype=object))).dropna()
+
+    # load cached mapping, unless it was computed by another version
+    key_map = pd.Series(dtype=object)
+    if cache_path and os.path.exists(cache_path):
+        cached = pd.read_pickle(cache_path, compression='gzip')
+        if cached.attrs.get('version') == TITLE_KEY_VERSION:
+            key_map = cached
+
+    # titles without a key yet
+    new_titles = uniques.difference(key_map.index)
+
+    if len(new_titles):
+
+        # compute new keys
+        new_keys = canonical_title_keys(new_titles)
+        new_keys.index = new_titles
+
+        # add to mapping
+        key_map = pd.concat([key_map, new_keys])
+        key_map.attrs['version'] = TITLE_KEY_VERSION
+
+        # save
+        if cache_path:
+            key_map.to_pickle(cache_path, compression='gzip')
+
+    return key_map
+
+
+def add_title_key(
+        df,
+        title_col='title',
+        key_col='title_key',
+        key_map=None,
+        cache_path=None):
+    '''
+
+    Function to add a categorical column of normalized title keys to a DataFrame.
+    Keys are computed over the distinct titles only and mapped back through
+    integer codes, so the cost is independent of the number of rows.
+
+
+    Input
+    -----
+    df : Pandas DataFrame
+            Data with a title column.
+
+
+    Optional input
+    --------------
+    title_col : str
+            Name of the title column (default='title').
+
+    key_col : str
+            Name of the new key column (default='title_key').
+
+    key_map : Pandas Series
+            Precomputed mapping from `title_key_map` (default=None, i.e. computed).
+
+    cache_path : str
+            File path of the cached mapping, if `key_map` is not given
+            (default=None, i.e. no caching).
+
+
+    Output
+    ------
+    df : Pandas DataFrame
+            Data with the added key column.
+
+    '''
+
+    # integer code of each row's title, and distinct titles
+    codes, uniques = pd.factorize(df[title_col])
+
+    # mapping for the distinct titles
+    if key_map is None:
+        key_map = title_key_map(uniques, cache_path=cache_path)
+
+    # key of each distinct title
+    unique_keys = key_map.reindex(uniques).values
+
+    # integer code of each distinct title's key, and distinct keys
+    key_codes, keys = pd.factorize(unique_keys)
+
+    # missing titles keep a missing key
+    row_codes = np.where(codes >= 0, key_codes[codes], -1)
+
+    # add column
+    df[key_col] = pd.Categorical.from_codes(row_codes, categories=keys)
+
+    return df
+
+
+def top_titles(df, n=25, title_col='title', key_col='title_key'):
+    '''
+
+    Function to rank titles by checkouts, grouping variants by their normalized
+    key and labeling each key with its most common title variant.
+
+
+    Input
+    -----
+    df : Pandas DataFrame
+            Data with title and title key columns (see `add_title_key`).
+
+
+    Optional input
+    --------------
+    n : int
+            Number of titles to return (default=25).
+
+    title_col : str
+            Name of the title column (default='title').
+
+    key_col : str
+            Name of the key column (default='title_key').
+
+
+    Output
+    ------
+    top : Pandas Series
+            Number of checkouts for the top `n` titles, indexed by the most common
+            title variant of each key.
+
+    '''
+
+    # checkouts per key
+    counts = df[key_col].value_counts().head(n)
+
+    # title variants of the top keys only
+    subset = df.loc[df[key_col].isin(counts.index), [key_col, title_col]]
+    variants = subset.groupby([key_col, title_col], observed=True).size()
+
+    # most common variant of each key
+    labels = variants.sort_values(ascending=False).reset_index().drop_duplicates(key_col)
+    labels = labels.set_index(key_col)[title_col]
+
+    # relabel counts
+    top = pd.Series(counts.values, index=labels.reindex(counts.index).values, name='checkouts')
+
+    return top
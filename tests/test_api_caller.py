@@ -0,0 +1,131 @@
+import io
+import os
+
+import pandas as pd
+import numpy as np
+
+from functions import api_caller
+
+
+class FakeResponse:
+    '''
+
+    Streamed response holding CSV bytes.
+
+    '''
+
+    def __init__(self, payload):
+        self.raw = io.BytesIO(payload)
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeClient:
+    '''
+
+    API client whose session returns the same CSV bytes for every request.
+
+    '''
+
+    uri_prefix = 'https://'
+    domain = 'example.org'
+    timeout = 10
+
+    def __init__(self, payload):
+        self.session = self
+        self.payload = payload
+
+    def get(self, *args, **kwargs):
+        return FakeResponse(self.payload)
+
+
+def checkouts_csv(n=300000):
+    '''
+
+    Function to build a CSV response large enough to be read in several blocks,
+    with a collection code that only appears in later batches.
+
+    '''
+
+    rng = np.random.default_rng(0)
+
+    df = pd.DataFrame({
+        'collection': rng.choice(['nanf', 'ncpic'], n),
+        'itemtype': rng.choice(['acbk', 'jcbk'], n),
+        'checkoutyear': 2019,
+        'checkoutdatetime': '2019-01-01T10:00:00.000'
+    })
+    df.loc[n // 2:, 'collection'] = rng.choice(['nanf', 'caln'], n - n // 2)
+
+    return df, df.to_csv(index=False).encode('utf-8')
+
+
+def batches(cache_dir=None, **kwargs):
+    '''
+
+    Function to request batches with fixed arguments.
+
+    '''
+
+    return api_caller.api_date_batches(
+        '5src-czff', 'token', 'checkoutdatetime', '2019-01-01', '2019-01-31',
+        batch_size=50000, cache_dir=cache_dir, **kwargs
+    )
+
+
+def test_batches_stay_categorical(monkeypatch, tmp_path):
+    df, payload = checkouts_csv()
+    monkeypatch.setattr(api_caller, 'get_client', lambda *args: FakeClient(payload))
+
+    # per-batch categories, combined with `union_categoricals`
+    combined = api_caller.concat_batches(batches())
+    assert isinstance(combined['collection'].dtype, pd.CategoricalDtype)
+    assert combined['collection'].astype(str).equals(df['collection'])
+
+    # fixed categories from the data dictionary
+    dd_path = tmp_path / 'data_dictionary.csv'
+    pd.DataFrame({
+        'Code': ['nanf', 'ncpic', 'caln', 'acbk', 'jcbk'],
+        'Description': '',
+        'Code Type': ['ItemCollection'] * 3 + ['ItemType'] * 2
+    }).to_csv(dd_path, index=False)
+
+    concatenated = pd.concat(batches(dtype=api_caller.csv_dtypes(str(dd_path))))
+    assert isinstance(concatenated['collection'].dtype, pd.CategoricalDtype)
+    assert isinstance(concatenated['itemtype'].dtype, pd.CategoricalDtype)
+    assert len(concatenated) == len(df)
+
+
+def test_cache_written_after_full_read(monkeypatch, tmp_path):
+    df, payload = checkouts_csv()
+    monkeypatch.setattr(api_caller, 'get_client', lambda *args: FakeClient(payload))
+
+    reader = batches(cache_dir=str(tmp_path))
+
+    # first batch decoded while the response is still being cached
+    first = next(reader)
+    assert [name.endswith('.tmp') for name in os.listdir(tmp_path)] == [True]
+
+    # cache kept once every batch is read
+    rest = list(reader)
+    assert [name.endswith('.csv.gz') for name in os.listdir(tmp_path)] == [True]
+    assert len(first) + sum(len(batch) for batch in rest) == len(df)
+
+    # cached response is read offline
+    cached = api_caller.concat_batches(batches(cache_dir=str(tmp_path), offline=True))
+    assert len(cached) == len(df)
+
+
+def test_partial_cache_removed_on_early_close(monkeypatch, tmp_path):
+    _, payload = checkouts_csv()
+    monkeypatch.setattr(api_caller, 'get_client', lambda *args: FakeClient(payload))
+
+    reader = batches(cache_dir=str(tmp_path))
+    next(reader)
+    reader.close()
+
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from functions.calendar_features import calendar_features
+
+
+def test_cache_extends_to_later_end(tmp_path):
+    cache_path = str(tmp_path / 'data' / 'calendar_features.pkl')
+
+    calendar_features(cache_path=cache_path, end='2021-12-31')
+    features = calendar_features(cache_path=cache_path, end='2030-12-31')
+
+    assert features.index[-1] == pd.Timestamp('2030-12-31')
+
+
+def test_ongoing_closure_ends_with_the_data(tmp_path):
+    cache_path = str(tmp_path / 'calendar_features.pkl')
+    index = pd.date_range('2020-01-01', '2021-06-30', freq='D')
+
+    features = calendar_features(index, cache_path=cache_path, data_end='2020-12-31')
+
+    # closed from March 13 through the last date of the data
+    assert features.loc['2020-03-13':'2020-12-31', 'closed'].eq(1).all()
+
+    # after the data, only holidays are flagged
+    after = features.loc['2021-01-01':]
+    assert after['closed'].equals(after['wa_holiday'])
@@ -0,0 +1,77 @@
+import pandas as pd
+import numpy as np
+
+from functions.data_cleaning import find_date_gaps, impute_date_gaps, imputer
+
+
+def daily_counts(start='2019-01-01', end='2019-06-30', seed=0):
+    '''
+
+    Function to build a small daily counts table for testing.
+
+    '''
+
+    index = pd.date_range(start, end, freq='D', name='date')
+    rng = np.random.default_rng(seed)
+
+    return pd.DataFrame(
+        {'total': rng.poisson(100, len(index)), 'books': rng.poisson(60, len(index))},
+        index=index
+    )
+
+
+def test_find_date_gaps_without_gaps():
+    df = daily_counts()
+
+    missing, runs, yearly = find_date_gaps(df)
+
+    assert len(missing) == 0
+    assert len(runs) == 0
+    assert list(runs.columns) == ['start', 'end', 'length']
+    assert yearly.to_dict() == {2019: 0}
+
+
+def test_find_date_gaps_runs():
+    df = daily_counts()
+    gaps = pd.to_datetime(['2019-02-01', '2019-02-02', '2019-02-03', '2019-04-10'])
+    df = df.drop(gaps)
+
+    missing, runs, yearly = find_date_gaps(df)
+
+    assert missing.equals(pd.DatetimeIndex(gaps))
+    assert runs['length'].tolist() == [3, 1]
+    assert runs['start'].tolist() == [gaps[0], gaps[3]]
+    assert runs['end'].tolist() == [gaps[2], gaps[3]]
+    assert yearly.to_dict() == {2019: 4}
+
+
+def test_impute_date_gaps_without_gaps():
+    df = daily_counts()
+
+    df_imputed = impute_date_gaps(df)
+
+    pd.testing.assert_frame_equal(df_imputed, df)
+
+
+def test_impute_date_gaps_matches_imputer():
+    df = daily_counts()
+
+    # gaps at least two weeks from either end, as `imputer` requires
+    gaps = pd.to_datetime(['2019-02-01', '2019-02-02', '2019-02-08', '2019-05-01'])
+    df = df.drop(gaps)
+
+    df_imputed = impute_date_gaps(df, window=2, unit='W')
+
+    # reference: `imputer` on a complete index, one date and column at a time
+    df_full = df.reindex(pd.date_range(df.index[0], df.index[-1], freq='D'))
+    expected = pd.DataFrame(
+        [[imputer(df_full, ind, col, window=2, unit='W') for col in df.columns]
+         for ind in gaps],
+        index=gaps, columns=df.columns
+    )
+
+    assert df_imputed.index.equals(df_full.index)
+    assert df_imputed.index.name == 'date'
+    pd.testing.assert_frame_equal(
+        df_imputed.loc[gaps], expected, check_dtype=False, check_freq=False, check_names=False
+    )
@@ -0,0 +1,30 @@
+import pandas as pd
+import numpy as np
+from statsmodels.tsa.stattools import acf, pacf
+
+from functions.diagnostics import acf_matrix, pacf_from_acf, run_diagnostics
+
+
+def test_acf_pacf_match_statsmodels():
+    rng = np.random.default_rng(0)
+    series = [np.cumsum(rng.normal(size=300)), rng.poisson(5, 200).astype(float)]
+
+    acfs = acf_matrix(series, nlags=10)
+    pacfs = pacf_from_acf(acfs)
+
+    for i, values in enumerate(series):
+        np.testing.assert_allclose(acfs[:, i], acf(values, nlags=10), atol=1e-10)
+        np.testing.assert_allclose(pacfs[:, i], pacf(values, nlags=10, method='ldb'), atol=1e-10)
+
+
+def test_tables_join_on_period():
+    rng = np.random.default_rng(0)
+    index = pd.date_range('2017-01-01', '2018-12-31', freq='D')
+    df = pd.DataFrame({'total': rng.poisson(100, len(index)).astype(float)}, index=index)
+
+    tests, correlations = run_diagnostics(df, nlags=5, n_jobs=1)
+
+    joined = correlations.merge(tests, on=['series', 'period', 'diff'])
+
+    assert set(tests['period']) == {'all', '2017', '2018'}
+    assert len(joined) == len(correlations)
@@ -0,0 +1,30 @@
+import pandas as pd
+import numpy as np
+
+from functions.duplicates import CSV_DUPLICATE_COLS, find_csv_duplicates
+
+
+def test_find_csv_duplicates_matches_pandas(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 5000
+
+    # raw checkouts with repeats of the same title on the same day at different times
+    times = pd.Timestamp('2019-01-01') + pd.to_timedelta(rng.integers(0, 3000, n), unit='min')
+    df = pd.DataFrame({
+        'BibNumber': rng.integers(0, 10, n),
+        'Collection': rng.choice(['nanf', 'ncpic', None], n),
+        'ItemTitle': rng.choice(['Dune', 'Emma', 'Beloved'], n),
+        'Subjects': rng.choice(['Fiction', None], n),
+        'CheckoutDateTime': pd.Series(times).dt.strftime('%m/%d/%Y %I:%M:%S %p')
+    })
+    csv_path = tmp_path / 'checkouts.csv'
+    df.to_csv(csv_path, index=False)
+
+    # small chunks so duplicates span chunks
+    report, dupes = find_csv_duplicates(str(csv_path), chunksize=777)
+
+    expected = df[CSV_DUPLICATE_COLS]
+    assert report['rows'] == n
+    assert report['duplicate_rows'] == expected.duplicated().sum()
+    assert report['rows_in_duplicate_groups'] == expected.duplicated(keep=False).sum()
+    assert dupes.sum() == report['rows_in_duplicate_groups']
@@ -0,0 +1,34 @@
+import datetime
+
+import pandas as pd
+
+from functions.profiling import profile_frame, merge_profiles, profile_report
+
+
+def test_merge_profiles_of_python_and_numpy_dates():
+    days = pd.date_range('2019-01-01', periods=50, freq='D')
+
+    # the same 50 days stored as Python dates in one chunk and datetime64 in another
+    as_dates = pd.DataFrame({'n': range(50)}, index=pd.Index(
+        [datetime.date(day.year, day.month, day.day) for day in days], name='date'
+    ))
+    as_datetimes = pd.DataFrame({'n': range(50)}, index=pd.DatetimeIndex(days, name='date'))
+
+    merged = merge_profiles(profile_frame(as_dates), profile_frame(as_datetimes))
+    report = profile_report(merged)
+
+    assert report.loc['date', 'distinct_est'] == 50
+    assert report.loc['date', 'min'] == days[0]
+    assert report.loc['date', 'max'] == days[-1]
+
+    # each day is counted twice, once per chunk
+    assert merged['columns']['date']['top'].eq(2).all()
+    assert len(merged['columns']['date']['top']) == 50
+
+
+def test_single_chunk_top_counts_are_exact():
+    df = pd.DataFrame({'x': ['a'] * 50 + ['b'] * 30 + list('cdefghij') * 3})
+
+    top = profile_frame(df, top_k=3)['columns']['x']['top']
+
+    assert top.to_dict() == {'a': 50, 'b': 30, 'c': 3}
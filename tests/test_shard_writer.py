@@ -0,0 +1,26 @@
+import os
+
+import pandas as pd
+import numpy as np
+
+from functions.shard_writer import save_shards, load_manifest, verify_shards
+
+
+def test_resave_with_fewer_files_removes_old_ones(tmp_path):
+    data_path = f'{tmp_path}/'
+    df = pd.DataFrame({'n': np.arange(1000), 'title': 'Dune'})
+
+    save_shards(df, data_path, file_prefix='t_', rows_per_file=100, n_jobs=2)
+    manifest = save_shards(df, data_path, file_prefix='t_', rows_per_file=400)
+
+    files = sorted(name for name in os.listdir(tmp_path) if name.endswith('.pkl'))
+    assert files == ['t_1.pkl', 't_2.pkl', 't_3.pkl']
+    assert [info['file'] for info in manifest['files']] == files
+    assert load_manifest(data_path, 't_')['total_rows'] == len(df)
+    assert verify_shards(data_path, 't_')['checksum_ok'].all()
+
+    # files read back in order
+    loaded = pd.concat(
+        [pd.read_pickle(data_path + name, compression='gzip') for name in files]
+    )
+    pd.testing.assert_frame_equal(loaded, df)